@@ -0,0 +1,172 @@
+"""Local stand-ins for the Telegram Bot API and the Tesla inventory site
+
+Both run on 127.0.0.1 with aiohttp so the bot can be driven end to end without network
+access. Point the bot at them with TELEGRAM_API_URL and TESLA_URL / INVENTORY_TARGETS.
+"""
+
+import asyncio
+import itertools
+import time
+
+from aiohttp import web
+
+
+class _LocalServer:
+    def __init__(self, host='127.0.0.1', port=0):
+        self.host = host
+        self.port = port
+        self._runner = None
+
+    def _app(self):
+        raise NotImplementedError
+
+    async def start(self):
+        """Start listening and return the base URL"""
+        self._runner = web.AppRunner(self._app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self.url
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+class FakeTelegramServer(_LocalServer):
+    """Minimal Bot API: records sendMessage calls and serves queued updates to getUpdates"""
+
+    def __init__(self, host='127.0.0.1', port=0):
+        super().__init__(host, port)
+        self.sent = []
+        self.webhook = None
+        self._updates = []
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._new_update = asyncio.Event()
+        self._new_message = asyncio.Event()
+
+    def _app(self):
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self._handle)
+        return app
+
+    @staticmethod
+    async def _params(request):
+        if request.content_type == 'application/json':
+            return await request.json()
+        return dict(await request.post())
+
+    @staticmethod
+    def _ok(result):
+        return web.json_response({'ok': True, 'result': result})
+
+    async def _handle(self, request):
+        method = request.match_info['method']
+        params = await self._params(request)
+
+        if method == 'getMe':
+            return self._ok({'id': 1, 'is_bot': True, 'first_name': 'Fake', 'username': 'fake_bot'})
+        if method == 'sendMessage':
+            self.sent.append((time.perf_counter(), str(params.get('chat_id')), params.get('text', '')))
+            self._new_message.set()
+            return self._ok({
+                'message_id': next(self._message_ids),
+                'date': int(time.time()),
+                'chat': {'id': int(params.get('chat_id', 0)), 'type': 'private'},
+                'text': params.get('text', '')
+            })
+        if method == 'getUpdates':
+            return self._ok(await self._get_updates(params))
+        if method == 'setWebhook':
+            self.webhook = params.get('url')
+            return self._ok(True)
+        if method == 'deleteWebhook':
+            self.webhook = None
+            return self._ok(True)
+        return web.json_response({'ok': False, 'error_code': 404, 'description': 'Not Found'}, status=404)
+
+    async def _get_updates(self, params):
+        offset = int(params.get('offset') or 0)
+        timeout = float(params.get('timeout') or 0)
+        self._updates = [u for u in self._updates if u['update_id'] >= offset]
+        if not self._updates and timeout:
+            self._new_update.clear()
+            try:
+                await asyncio.wait_for(self._new_update.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self._updates[:int(params.get('limit') or 100)]
+
+    def make_update(self, text, chat_id=1):
+        """Build a message update as Telegram would send it"""
+        update_id = next(self._update_ids)
+        return {
+            'update_id': update_id,
+            'message': {
+                'message_id': update_id,
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'from': {'id': chat_id, 'is_bot': False, 'first_name': 'Test'},
+                'text': text
+            }
+        }
+
+    def queue_update(self, text, chat_id=1):
+        """Make an update available to the next getUpdates call"""
+        update = self.make_update(text, chat_id)
+        self._updates.append(update)
+        self._new_update.set()
+        return update
+
+    async def wait_for_messages(self, count, timeout=30):
+        """Wait until at least `count` messages were sent; returns False on timeout"""
+        deadline = time.perf_counter() + timeout
+        while len(self.sent) < count:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return False
+            self._new_message.clear()
+            try:
+                await asyncio.wait_for(self._new_message.wait(), remaining)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+
+class FakeTeslaServer(_LocalServer):
+    """Serves inventory pages from memory, with optional ETag support"""
+
+    def __init__(self, host='127.0.0.1', port=0, etag=False):
+        super().__init__(host, port)
+        self.etag = etag
+        self.pages = {}
+        self.requests = 0
+
+    def _app(self):
+        app = web.Application()
+        app.router.add_get('/{path:.*}', self._handle)
+        return app
+
+    def set_page(self, path, body, content_type=None):
+        """Serve `body` at /path"""
+        if content_type is None:
+            content_type = 'application/json' if body.lstrip()[:1] in (b'{', b'[') else 'text/html'
+        self.pages[path.lstrip('/')] = (body, content_type, f'"{hash(body) & 0xffffffff:x}"')
+
+    async def _handle(self, request):
+        self.requests += 1
+        page = self.pages.get(request.match_info['path'])
+        if page is None:
+            return web.Response(status=404)
+        body, content_type, etag = page
+        if self.etag and request.headers.get('If-None-Match') == etag:
+            return web.Response(status=304)
+        headers = {'ETag': etag} if self.etag else {}
+        return web.Response(body=body, content_type=content_type, headers=headers)
@@ -0,0 +1,110 @@
+"""Inventory page fixtures for the benchmarks
+
+Fixtures are expanded from a recorded inventory API entry (recorded/sample_vehicle.json)
+with a fixed seed, so every run and every machine benchmarks exactly the same pages.
+"""
+
+import copy
+import json
+import os
+import random
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'recorded')
+SIZES = (10, 100, 1000)
+
+MODELS = {
+    'm3': ('Model 3', ['Model 3 Rear-Wheel Drive', 'Model 3 Long Range All-Wheel Drive', 'Model 3 Performance']),
+    'my': ('Model Y', ['Model Y Rear-Wheel Drive', 'Model Y Long Range Dual Motor All-Wheel Drive', 'Model Y Performance']),
+    'ms': ('Model S', ['Model S Dual Motor All-Wheel Drive', 'Model S Plaid']),
+    'mx': ('Model X', ['Model X Dual Motor All-Wheel Drive', 'Model X Plaid'])
+}
+PAINTS = ['WHITE', 'BLACK', 'SILVER', 'BLUE', 'RED', 'GRAY']
+CITIES = ['Istanbul', 'Ankara', 'Izmir', 'Bursa', 'Antalya']
+
+
+def load_sample():
+    with open(os.path.join(FIXTURE_DIR, 'sample_vehicle.json'), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def build_records(count, seed=42):
+    """Build `count` inventory API entries shaped like the recorded sample"""
+    rng = random.Random(seed)
+    sample = load_sample()
+    records = []
+    for i in range(count):
+        code = rng.choice(list(MODELS))
+        record = copy.deepcopy(sample)
+        record['VIN'] = f"{sample['VIN'][:11]}{i:06d}"
+        record['Model'] = code
+        record['TrimName'] = rng.choice(MODELS[code][1])
+        record['PAINT'] = [rng.choice(PAINTS)]
+        record['InventoryPrice'] = record['Price'] = rng.randrange(1_800_000, 6_000_000, 1000)
+        record['City'] = record['MetroName'] = rng.choice(CITIES)
+        records.append(record)
+    return records
+
+
+def mutate(records, fraction=0.1, seed=7):
+    """Copy of `records` where a fraction was sold, repriced or newly listed"""
+    rng = random.Random(seed)
+    records = copy.deepcopy(records)
+    changes = max(1, int(len(records) * fraction))
+    for _ in range(changes // 3 or 1):
+        records.pop(rng.randrange(len(records)))
+    for record in rng.sample(records, min(len(records), changes // 3 or 1)):
+        record['InventoryPrice'] = record['Price'] = record['Price'] - 50_000
+    extra = build_records(changes // 3 or 1, seed=seed + 1)
+    for i, record in enumerate(extra):
+        record['VIN'] = f"NEW{seed:04d}{i:010d}"
+    return records + extra
+
+
+def render_json(records):
+    """Inventory API response body"""
+    return json.dumps({
+        'results': records,
+        'total_matches_found': str(len(records))
+    }).encode('utf-8')
+
+
+def render_html(records):
+    """Rendered inventory page with vehicle cards and no embedded state"""
+    cards = []
+    for record in records:
+        model = MODELS[record['Model']][0]
+        cards.append(
+            f'<article class="result card inventory-card" data-testid="vehicle-card-{record["VIN"]}">'
+            f'<div class="vehicle-card__header"><h3 class="vehicle-card__title">{model}</h3>'
+            f'<span class="vehicle-card__trim">{record["TrimName"]}</span></div>'
+            f'<div class="vehicle-card__body"><ul class="vehicle-card__features">'
+            f'<li>{record["PAINT"][0].title()} Boya</li><li>{record["WHEELS"][0].title()} Jant</li>'
+            f'<li>{record["Odometer"]} {record["OdometerType"]}</li></ul>'
+            f'<div class="vehicle-card__price">{record["Price"]:,} TL</div>'
+            f'<div class="vehicle-card__location">{record["City"]}</div></div>'
+            f'<div class="vehicle-card__footer"><a class="product-link" href="/tr_tr/{record["Model"]}/order/{record["VIN"]}">'
+            f'Görüntüle</a></div></article>'
+        )
+    page = (
+        '<!DOCTYPE html><html lang="tr"><head><meta charset="utf-8"><title>Envanter | Tesla</title></head>'
+        '<body><header class="tds-site-header"><nav class="tds-site-nav">'
+        + ''.join(f'<a class="tds-site-nav-item" href="/{m}">{m}</a>' for m in ('model3', 'modely', 'models', 'modelx'))
+        + '</nav></header><main class="inventory-page"><section class="results-container">'
+        + ''.join(cards)
+        + '</section></main><footer class="tds-footer">Tesla © 2024</footer></body></html>'
+    )
+    return page.encode('utf-8')
+
+
+def ensure_fixtures(sizes=SIZES):
+    """Write inventory_<n>.json / .html into the fixture directory if missing; return their paths"""
+    paths = {}
+    for size in sizes:
+        records = build_records(size)
+        for ext, render in (('json', render_json), ('html', render_html)):
+            path = os.path.join(FIXTURE_DIR, f'inventory_{size}.{ext}')
+            if not os.path.exists(path):
+                with open(path, 'wb') as f:
+                    f.write(render(records))
+            paths[(size, ext)] = path
+    return paths
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""Replay recorded inventory responses through the bot, offline and accelerated
+
+Record in production by setting RECORD_DIR (every raw response is kept with its time),
+then feed the recording through fetch -> extract -> check_inventory -> notifications
+with Telegram stubbed out. Store and history are stamped with the recorded times, so
+weeks of captured checks replay in seconds with the same diffs and price drops.
+
+    python benchmarks/replay.py RECORDING                  # as fast as possible
+    python benchmarks/replay.py RECORDING --speed 3600     # one recorded hour per second
+    python benchmarks/replay.py RECORDING --notify-first   # first page counts as all new
+    python benchmarks/replay.py RECORDING --telegram-limits --json results/replay.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+# Keep the bot away from a developer's real .env / Telegram chat
+os.environ.update({
+    'TELEGRAM_BOT_TOKEN': '123456:REPLAY',
+    'TELEGRAM_CHAT_ID': '1',
+    'DEBUG': 'false'
+})
+os.environ.setdefault('MODELS', '["Model 3", "Model Y", "Model S", "Model X"]')
+os.environ.pop('RECORD_DIR', None)
+
+import tesla_bot  # noqa: E402
+
+
+class StubTelegram:
+    """Stands in for telegram.Bot: accepts every message instantly and keeps a tally"""
+
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append((time.perf_counter(), chat_id, len(text)))
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+
+async def replay(recording, data_dir, speed, notify_first, telegram_limits):
+    entries = recording.entries()
+    if not entries:
+        raise SystemExit(f"{recording.index_path} holds no responses")
+
+    # Targets come from the recording; models still come from MODELS / INVENTORY_TARGETS defaults
+    urls = {}
+    for entry in entries:
+        urls.setdefault(entry['target'], entry['url'])
+    os.environ['INVENTORY_TARGETS'] = json.dumps([{'name': name, 'url': url} for name, url in urls.items()])
+    os.environ['DATA_DIR'] = data_dir
+
+    bot = tesla_bot.TeslaInventoryBot()
+    await bot.fetcher.close()
+    fetcher = bot.fetcher = tesla_bot.ReplayFetcher(recording, entries)
+    telegram = bot.notifier.bot = StubTelegram()
+    if not telegram_limits:
+        # Measure the pipeline, not Telegram's rate limits
+        bot.notifier.CHAT_RATE = bot.notifier.GROUP_RATE = 1_000_000
+        bot.notifier.global_bucket = tesla_bot.TokenBucket(1_000_000)
+    if not notify_first:
+        # Production had already seen the inventory when the recording started
+        for name in urls:
+            bot.store.set_meta(f'needs_baseline:{name}', '1')
+    targets = {target.name: target for target in bot.targets}
+
+    checks = []
+    notifier_task = asyncio.create_task(bot.notifier.run())
+    first_t = entries[0]['t']
+    started = time.perf_counter()
+    try:
+        while True:
+            heads = [(entry['t'], name) for name in targets if (entry := fetcher.peek(name))]
+            if not heads:
+                break
+            at, name = min(heads)
+            if speed:
+                delay = (at - first_t) / speed - (time.perf_counter() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            target = targets[name]
+            status = fetcher.peek(name)['status']
+            left = len(fetcher.queues[name])
+            added = tesla_bot.metrics.value('tesla_diff_vehicles_total', target=name, kind='added')
+            removed = tesla_bot.metrics.value('tesla_diff_vehicles_total', target=name, kind='removed')
+            changed = tesla_bot.metrics.value('tesla_diff_vehicles_total', target=name, kind='changed')
+            check_started = time.perf_counter()
+            await bot.check_inventory(target, now=at)
+            checks.append({
+                't': at,
+                'target': name,
+                'status': status,
+                'seconds': time.perf_counter() - check_started,
+                'vehicles': len(target.vehicles),
+                'added': tesla_bot.metrics.value('tesla_diff_vehicles_total', target=name, kind='added') - added,
+                'removed': tesla_bot.metrics.value('tesla_diff_vehicles_total', target=name, kind='removed') - removed,
+                'changed': tesla_bot.metrics.value('tesla_diff_vehicles_total', target=name, kind='changed') - changed
+            })
+            if len(fetcher.queues[name]) == left:
+                # The check never reached the fetcher; skip the response rather than spin
+                fetcher.queues[name].popleft()
+
+        checks_done = time.perf_counter()
+        while bot.notifier.pending_count():
+            await asyncio.sleep(0.01)
+        drained = time.perf_counter()
+    finally:
+        notifier_task.cancel()
+        bot.parse_pool.close()
+        bot.store.close()
+
+    span = entries[-1]['t'] - first_t
+    wall = drained - started
+    check_seconds = [check['seconds'] for check in checks]
+    statuses = {}
+    for entry in entries:
+        statuses[str(entry['status'])] = statuses.get(str(entry['status']), 0) + 1
+    return {
+        'summary': {
+            'responses': len(entries),
+            'statuses': statuses,
+            'checks': len(checks),
+            'recorded_hours': span / 3600,
+            'replay_seconds': wall,
+            'speedup': span / wall if wall else None,
+            'check_median_ms': statistics.median(check_seconds) * 1000,
+            'check_p95_ms': percentile(check_seconds, 0.95) * 1000,
+            'check_max_ms': max(check_seconds) * 1000,
+            'checks_per_second': len(checks) / (checks_done - started),
+            'vehicles_added': sum(check['added'] for check in checks),
+            'vehicles_removed': sum(check['removed'] for check in checks),
+            'vehicles_changed': sum(check['changed'] for check in checks),
+            'notifications': len(telegram.sent),
+            'notification_chats': len({chat_id for _, chat_id, _ in telegram.sent}),
+            'notify_drain_ms': (drained - checks_done) * 1000,
+            'cache': dict(bot.http_cache.stats)
+        },
+        'storms': sorted(checks, key=lambda check: check['added'], reverse=True)[:5],
+        'checks': checks
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('recording', help='directory written by the bot with RECORD_DIR set')
+    parser.add_argument('--speed', type=float, default=0, help='recorded seconds per real second (0: no waiting)')
+    parser.add_argument('--notify-first', action='store_true', help='notify everything on the first page too')
+    parser.add_argument('--telegram-limits', action='store_true', help="keep Telegram's rate limits")
+    parser.add_argument('--data-dir', help='keep the replayed store and history here instead of a temp dir')
+    parser.add_argument('--json', help='also write the full results, every check included, to this file')
+    parser.add_argument('--verbose', action='store_true', help="show the bot's own logging")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    recording = tesla_bot.FetchRecording(args.recording)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        data_dir = args.data_dir or temp_dir
+        os.makedirs(data_dir, exist_ok=True)
+        results = asyncio.run(replay(recording, data_dir, args.speed, args.notify_first, args.telegram_limits))
+
+    for name, value in results['summary'].items():
+        print(f"{name:<20} {value:.2f}" if isinstance(value, float) else f"{name:<20} {value}")
+    print("\nLargest bursts of new vehicles:")
+    for check in results['storms']:
+        if check['added']:
+            when = time.strftime('%Y-%m-%d %H:%M', time.localtime(check['t']))
+            print(f"  {when}  [{check['target']}]  +{check['added']} / -{check['removed']} / ~{check['changed']}")
+
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
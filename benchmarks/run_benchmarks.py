@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""Offline benchmarks for the inventory hot path
+
+Drives extraction, get_tesla_inventory, the check_inventory diff and process_command
+against recorded-shape fixtures (10/100/1000 vehicles) served by a local fake Tesla
+site and a fake Telegram Bot API, and measures cold start and steady-state RSS of the
+default and LOW_MEMORY profiles in fresh interpreters. Nothing leaves 127.0.0.1.
+
+    python benchmarks/run_benchmarks.py                  # run and print results
+    python benchmarks/run_benchmarks.py --save-baseline  # store results as the baseline
+    python benchmarks/run_benchmarks.py --compare        # fail if slower than the baseline
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+# Keep the bot away from a developer's real .env / Telegram chat
+os.environ.update({
+    'TELEGRAM_BOT_TOKEN': '123456:BENCHMARK',
+    'TELEGRAM_CHAT_ID': '1',
+    'MODELS': '["Model 3", "Model Y", "Model S", "Model X"]',
+    'DEBUG': 'false'
+})
+
+import fixtures  # noqa: E402
+from fake_servers import FakeTelegramServer, FakeTeslaServer  # noqa: E402
+
+import tesla_bot  # noqa: E402
+from telegram import Update  # noqa: E402
+
+BASELINE_FILE = os.path.join(BENCH_DIR, 'baseline.json')
+RESULTS_FILE = os.path.join(BENCH_DIR, 'results', 'latest.json')
+MODELS = json.loads(os.environ['MODELS'])
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def bench_extract(body, repeat):
+    """Median extraction time plus allocation peak for one page"""
+    timings = []
+    vehicles = []
+    for _ in range(repeat):
+        chain = tesla_bot.ExtractorChain([tesla_bot.JsonInventoryExtractor(), tesla_bot.HtmlCardExtractor()])
+        started = time.perf_counter()
+        _, vehicles = chain.extract(body, 'http://fixture', MODELS)
+        timings.append(time.perf_counter() - started)
+
+    chain = tesla_bot.ExtractorChain([tesla_bot.JsonInventoryExtractor(), tesla_bot.HtmlCardExtractor()])
+    tracemalloc.start()
+    chain.extract(body, 'http://fixture', MODELS)
+    _, peak = tracemalloc.get_traced_memory()
+    blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+    tracemalloc.stop()
+
+    return {
+        'vehicles': len(vehicles),
+        'parse_ms': statistics.median(timings) * 1000,
+        'alloc_peak_kb': peak / 1024,
+        'alloc_live_blocks': blocks,
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+def new_bot(data_dir, telegram_url, inventory_url):
+    os.environ['DATA_DIR'] = data_dir
+    os.environ['TELEGRAM_API_URL'] = telegram_url
+    os.environ['TESLA_URL'] = inventory_url
+    bot = tesla_bot.TeslaInventoryBot()
+    # Measure the pipeline, not Telegram's per-chat limit
+    bot.notifier.CHAT_RATE = 10_000
+    return bot
+
+
+async def bench_end_to_end(size, ext, telegram, tesla, repeat):
+    """get_tesla_inventory, first/steady-state check_inventory diffs and notification latency"""
+    records = fixtures.build_records(size)
+    render = fixtures.render_json if ext == 'json' else fixtures.render_html
+    path = f'inventory_{size}.{ext}'
+    tesla.set_page(path, render(records))
+
+    result = {}
+    with tempfile.TemporaryDirectory() as data_dir:
+        bot = new_bot(data_dir, telegram.url, f'{tesla.url}/{path}')
+        target = bot.targets[0]
+        notifier_task = asyncio.create_task(bot.notifier.run())
+        try:
+            timings = []
+            for _ in range(repeat):
+                bot.http_cache.entries.clear()
+                started = time.perf_counter()
+                await bot.get_tesla_inventory(target)
+                timings.append(time.perf_counter() - started)
+            result['fetch_extract_ms'] = statistics.median(timings) * 1000
+
+            # First check: everything is new and gets notified
+            bot.http_cache.entries.clear()
+            sent_before = len(telegram.sent)
+            started = time.perf_counter()
+            await bot.check_inventory(target)
+            result['check_all_new_ms'] = (time.perf_counter() - started) * 1000
+            expected = sent_before + bot.notifier.pending_count()
+            delivered = await telegram.wait_for_messages(expected, timeout=120)
+            result['notify_messages'] = expected - sent_before
+            result['notify_latency_ms'] = (telegram.sent[-1][0] - started) * 1000 if delivered else None
+
+            # Steady state: ~10% of the inventory changed since the last check
+            tesla.set_page(path, render(fixtures.mutate(records)))
+            started = time.perf_counter()
+            await bot.check_inventory(target)
+            result['check_changed_ms'] = (time.perf_counter() - started) * 1000
+
+            # Nothing changed: should be answered by the cache
+            started = time.perf_counter()
+            await bot.check_inventory(target)
+            result['check_unchanged_ms'] = (time.perf_counter() - started) * 1000
+        finally:
+            notifier_task.cancel()
+            await bot.fetcher.close()
+            bot.parse_pool.close()
+            bot.store.close()
+    result['peak_rss_mb'] = peak_rss_mb()
+    return result
+
+
+async def bench_commands(telegram, tesla, repeat):
+    """Latency from an incoming update to the reply reaching the fake Telegram API"""
+    results = {}
+    with tempfile.TemporaryDirectory() as data_dir:
+        tesla.set_page('inventory_commands.json', fixtures.render_json(fixtures.build_records(100)))
+        bot = new_bot(data_dir, telegram.url, f'{tesla.url}/inventory_commands.json')
+        try:
+            # Plain /manuel-arama answers from the snapshot; "yenile" forces a fetch
+            await bot.get_tesla_inventory(bot.targets[0])
+            for command in ('/ping', '/durum', '/help', '/manuel-arama', '/manuel-arama yenile'):
+                timings = []
+                for _ in range(repeat):
+                    update = Update.de_json(telegram.make_update(command), bot.bot)
+                    expected = len(telegram.sent) + (2 if command == '/manuel-arama yenile' else 1)
+                    started = time.perf_counter()
+                    bot.handle_update(update)
+                    await telegram.wait_for_messages(expected, timeout=30)
+                    timings.append(telegram.sent[-1][0] - started)
+                results[command] = {'latency_ms': statistics.median(timings) * 1000}
+        finally:
+            await bot.fetcher.close()
+            bot.parse_pool.close()
+            bot.store.close()
+    return results
+
+
+def bench_startup(profile, telegram_url, inventory_url, cycles=10):
+    """Cold start and RSS after `cycles` full checks, in a fresh interpreter per profile"""
+    with tempfile.TemporaryDirectory() as data_dir:
+        env = dict(os.environ, DATA_DIR=data_dir, TELEGRAM_API_URL=telegram_url, TESLA_URL=inventory_url,
+                   LOW_MEMORY='true' if profile == 'low_memory' else 'false')
+        env.pop('METRICS_PORT', None)
+        output = subprocess.run(
+            [sys.executable, os.path.join(BENCH_DIR, 'startup_probe.py'), str(cycles)],
+            env=env, capture_output=True, text=True, check=True
+        ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+async def run_startup(telegram, tesla):
+    """Startup probes run in subprocesses while this process serves the fake APIs"""
+    results = {}
+    tesla.set_page('inventory_startup.html', fixtures.render_html(fixtures.build_records(1000)))
+    for profile in ('default', 'low_memory'):
+        results[profile] = await asyncio.to_thread(
+            bench_startup, profile, telegram.url, f'{tesla.url}/inventory_startup.html'
+        )
+    return results
+
+
+async def run(sizes, repeat):
+    telegram = FakeTelegramServer()
+    tesla = FakeTeslaServer()
+    await telegram.start()
+    await tesla.start()
+    try:
+        results = {'extract': {}, 'end_to_end': {}}
+        for size in sizes:
+            for ext in ('json', 'html'):
+                with open(fixtures.ensure_fixtures([size])[(size, ext)], 'rb') as f:
+                    body = f.read()
+                key = f'{ext}_{size}'
+                results['extract'][key] = bench_extract(body, repeat)
+                results['end_to_end'][key] = await bench_end_to_end(size, ext, telegram, tesla, repeat)
+        results['commands'] = await bench_commands(telegram, tesla, repeat)
+        results['startup'] = await run_startup(telegram, tesla)
+        return results
+    finally:
+        await telegram.stop()
+        await tesla.stop()
+
+
+def flatten(results, prefix=''):
+    flat = {}
+    for key, value in results.items():
+        name = f'{prefix}{key}'
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + '.'))
+        else:
+            flat[name] = value
+    return flat
+
+
+def print_results(results, baseline=None):
+    flat = flatten(results)
+    base = flatten(baseline) if baseline else {}
+    width = max(len(name) for name in flat)
+    for name, value in flat.items():
+        line = f"{name:<{width}}  {value:>12.2f}" if isinstance(value, float) else f"{name:<{width}}  {value!s:>12}"
+        if isinstance(value, (int, float)) and isinstance(base.get(name), (int, float)) and base[name]:
+            line += f"  ({(value / base[name] - 1) * 100:+.0f}% vs baseline)"
+        print(line)
+
+
+def regressions(results, baseline, threshold, min_delta_ms=2.0):
+    """Time/memory metrics that got worse than the baseline by more than `threshold`
+
+    Timings that moved by less than `min_delta_ms` are scheduler noise, not regressions.
+    """
+    flat = flatten(results)
+    found = []
+    for name, base in flatten(baseline).items():
+        if not name.endswith(('_ms', '_kb', '_mb')):
+            continue
+        value = flat.get(name)
+        if isinstance(value, (int, float)) and isinstance(base, (int, float)) and base > 0:
+            if name.endswith('_ms') and value - base < min_delta_ms:
+                continue
+            if value > base * (1 + threshold):
+                found.append((name, base, value))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(fixtures.SIZES))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--save-baseline', action='store_true', help='store these results as the baseline')
+    parser.add_argument('--compare', action='store_true', help='exit non-zero on regressions against the baseline')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed slowdown before --compare fails')
+    parser.add_argument('--min-delta-ms', type=float, default=2.0, help='ignore timing changes smaller than this')
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    results = asyncio.run(run(args.sizes, args.repeat))
+    results['meta'] = {
+        'python': sys.version.split()[0],
+        'platform': sys.platform,
+        'machine': os.uname().machine,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S')
+    }
+
+    baseline = None
+    if os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    print_results({k: v for k, v in results.items() if k != 'meta'},
+                  {k: v for k, v in (baseline or {}).items() if k != 'meta'})
+
+    os.makedirs(os.path.dirname(RESULTS_FILE), exist_ok=True)
+    with open(RESULTS_FILE, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.save_baseline:
+        with open(BASELINE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"\nBaseline saved to {BASELINE_FILE}")
+
+    if args.compare:
+        if baseline is None:
+            print("\nNo baseline to compare against; run with --save-baseline first")
+            return 1
+        found = regressions(results, baseline, args.threshold, args.min_delta_ms)
+        if found:
+            print(f"\nRegressions (> {args.threshold:.0%} worse than baseline):")
+            for name, base, value in found:
+                print(f"  {name}: {base:.2f} -> {value:.2f}")
+            return 1
+        print("\nNo regressions against the baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""Cold start and steady-state memory of the bot, measured in a fresh interpreter
+
+Run by run_benchmarks.py once per profile. The environment (TESLA_URL, TELEGRAM_API_URL,
+DATA_DIR, LOW_MEMORY, ...) is set by the caller; prints one JSON object.
+"""
+
+import json
+import os
+import sys
+import time
+
+started = time.perf_counter()
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio  # noqa: E402
+
+
+def rss_mb():
+    with open('/proc/self/statm', 'r') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+
+
+async def steady_state(bot, cycles):
+    target = bot.targets[0]
+    for _ in range(cycles):
+        # Force a full fetch + parse + diff every cycle
+        bot.http_cache.entries.clear()
+        await bot.check_inventory(target)
+    await bot.fetcher.close()
+
+
+def main():
+    cycles = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    result = {'python_start_rss_mb': rss_mb()}
+
+    import tesla_bot
+    imported = time.perf_counter()
+    result['import_ms'] = (imported - started) * 1000
+    result['import_rss_mb'] = rss_mb()
+    result['modules_loaded'] = len(sys.modules)
+
+    bot = tesla_bot.TeslaInventoryBot()
+    result['init_ms'] = (time.perf_counter() - imported) * 1000
+    result['cold_start_ms'] = (time.perf_counter() - started) * 1000
+    result['cold_start_rss_mb'] = rss_mb()
+
+    asyncio.run(steady_state(bot, cycles))
+    result['steady_state_rss_mb'] = rss_mb()
+    result['parse_workers_rss_mb'] = bot.parse_pool.worker_rss_bytes() / (1024 * 1024)
+    result['parse_mode'] = bot.parse_pool.mode
+    result['bs4_loaded'] = 'bs4' in sys.modules
+    result['aiohttp_web_loaded'] = 'aiohttp.web' in sys.modules
+    bot.parse_pool.close()
+    bot.store.close()
+    print(json.dumps(result))
+
+
+if __name__ == '__main__':
+    main()
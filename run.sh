@@ -5,6 +5,10 @@ TELEGRAM_BOT_TOKEN=$(bashio::config 'telegram_bot_token')
 TELEGRAM_CHAT_ID=$(bashio::config 'telegram_chat_id')
 CHECK_INTERVAL=$(bashio::config 'check_interval')
 MODELS=$(bashio::config 'models')
+UPDATE_MODE=$(bashio::config 'update_mode')
+WEBHOOK_URL=$(bashio::config 'webhook_url')
+WEBHOOK_SECRET=$(bashio::config 'webhook_secret')
+LOW_MEMORY=$(bashio::config 'low_memory')
 
 # Validate required configuration
 if [ -z "$TELEGRAM_BOT_TOKEN" ]; then
@@ -25,6 +29,10 @@ export TELEGRAM_BOT_TOKEN
 export TELEGRAM_CHAT_ID
 export CHECK_INTERVAL
 export MODELS
+export UPDATE_MODE
+export WEBHOOK_URL
+export WEBHOOK_SECRET
+export LOW_MEMORY
 
 # Start the Python application
 python3 /app/tesla_bot.py
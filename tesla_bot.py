@@ -1,12 +1,29 @@
 import os
 import json
+import random
 import time
 import logging
-import requests
-from bs4 import BeautifulSoup
-from telegram import Bot
-from telegram.error import TelegramError
+import ssl
+import aiohttp
+from telegram import Bot, Update
+from telegram.error import BadRequest, Conflict, Forbidden, NetworkError, RetryAfter, TelegramError, TimedOut
+from telegram.request import HTTPXRequest
 import asyncio
+import collections
+import contextlib
+import gzip
+import hashlib
+import html
+import multiprocessing
+import re
+import secrets
+import sqlite3
+import struct
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import asdict, dataclass
+from typing import Callable, Optional
 from datetime import datetime
 from dotenv import load_dotenv
 
@@ -20,6 +37,2328 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
+# httpx logs every Telegram request at INFO, which floods the log with long polling
+logging.getLogger('httpx').setLevel(logging.WARNING)
+
+BROWSER_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'tr-TR,tr;q=0.9,en;q=0.8',
+    'Accept-Encoding': 'gzip, deflate',
+    'DNT': '1',
+    'Upgrade-Insecure-Requests': '1',
+    'Sec-Fetch-Dest': 'document',
+    'Sec-Fetch-Mode': 'navigate',
+    'Sec-Fetch-Site': 'none',
+    'Cache-Control': 'max-age=0'
+}
+
+# Minimal headers used as a second attempt when Tesla answers 403
+SIMPLE_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
+}
+
+# Histogram buckets in seconds, from a quick parse on a Pi to a slow Tesla response
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class Metrics:
+    """In-process counters, gauges and histograms rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._types = {}
+        self._help = {}
+        self._values = {}
+        self._histograms = {}
+        self._callbacks = {}
+
+    def _declare(self, name, kind, help_text):
+        self._types.setdefault(name, kind)
+        self._help.setdefault(name, help_text)
+
+    @staticmethod
+    def _key(labels):
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name, amount=1, help_text='', **labels):
+        self._declare(name, 'counter', help_text)
+        series = self._values.setdefault(name, {})
+        key = self._key(labels)
+        series[key] = series.get(key, 0) + amount
+
+    def set(self, name, value, help_text='', **labels):
+        self._declare(name, 'gauge', help_text)
+        self._values.setdefault(name, {})[self._key(labels)] = value
+
+    def gauge_callback(self, name, func, help_text=''):
+        """Gauge whose value is read from `func` when the metrics are collected"""
+        self._declare(name, 'gauge', help_text)
+        self._callbacks[name] = func
+
+    def observe(self, name, value, help_text='', buckets=LATENCY_BUCKETS, **labels):
+        self._declare(name, 'histogram', help_text)
+        series = self._histograms.setdefault(name, {})
+        key = self._key(labels)
+        hist = series.get(key)
+        if hist is None:
+            hist = series[key] = {'buckets': buckets, 'counts': [0] * len(buckets), 'sum': 0.0, 'count': 0, 'last': 0.0}
+        for i, bound in enumerate(hist['buckets']):
+            if value <= bound:
+                hist['counts'][i] += 1
+        hist['sum'] += value
+        hist['count'] += 1
+        hist['last'] = value
+
+    def summary(self, name, **labels):
+        """(count, average, last) of a histogram, over every series matching the given labels"""
+        wanted = set(self._key(labels))
+        count, total, last = 0, 0.0, None
+        for key, hist in self._histograms.get(name, {}).items():
+            if wanted <= set(key):
+                count += hist['count']
+                total += hist['sum']
+                last = hist['last']
+        return count, (total / count if count else 0.0), last
+
+    def value(self, name, **labels):
+        """Sum of a counter or gauge over every series matching the given labels"""
+        if name in self._callbacks:
+            return self._callbacks[name]()
+        wanted = set(self._key(labels))
+        return sum(v for key, v in self._values.get(name, {}).items() if wanted <= set(key))
+
+    @staticmethod
+    def _labels(key, extra=()):
+        pairs = list(key) + list(extra)
+        if not pairs:
+            return ''
+        escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+        return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+    def render(self):
+        lines = []
+        for name in sorted(self._types):
+            if self._help[name]:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} {self._types[name]}")
+            if name in self._callbacks:
+                try:
+                    lines.append(f"{name} {self._callbacks[name]()}")
+                except Exception as e:
+                    logger.debug(f"Metric callback {name} failed: {e}")
+            for key, value in sorted(self._values.get(name, {}).items()):
+                lines.append(f"{name}{self._labels(key)} {value}")
+            for key, hist in sorted(self._histograms.get(name, {}).items()):
+                for bound, count in zip(hist['buckets'], hist['counts']):
+                    lines.append(f"{name}_bucket{self._labels(key, [('le', bound)])} {count}")
+                lines.append(f"{name}_bucket{self._labels(key, [('le', '+Inf')])} {hist['count']}")
+                lines.append(f"{name}_sum{self._labels(key)} {hist['sum']}")
+                lines.append(f"{name}_count{self._labels(key)} {hist['count']}")
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+def process_rss_bytes():
+    """Current resident set size; falls back to the peak where /proc is not available"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        import resource
+        # ru_maxrss is in kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+metrics.gauge_callback('process_resident_memory_bytes', process_rss_bytes, 'Resident memory size in bytes')
+
+
+class FetchError(Exception):
+    """Raised when an inventory page could not be fetched"""
+
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+    @property
+    def should_back_off(self):
+        """True for answers that mean Tesla wants us to slow down (403/429/5xx)"""
+        return self.status is not None and (self.status in (403, 429) or self.status >= 500)
+
+
+class InventoryFetcher:
+    """Async HTTP client with a persistent connection pool for inventory pages"""
+
+    def __init__(self, connect_timeout=10, read_timeout=30, limit_per_host=2, keepalive_timeout=330,
+                 max_concurrent=4):
+        self.timeout = aiohttp.ClientTimeout(
+            total=None,
+            sock_connect=connect_timeout,
+            sock_read=read_timeout
+        )
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.max_concurrent = max_concurrent
+        # Global cap on in-flight fetches across every target
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._ssl_context = ssl.create_default_context()
+        self._session = None
+
+    def _get_session(self):
+        """Create the shared session lazily, inside the running event loop"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_concurrent,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=300,
+                ssl=self._ssl_context
+            )
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self._session
+
+    async def fetch(self, url, headers=None, cache=None, cache_key=None):
+        """Fetch a URL and return the raw body, raising FetchError on failure
+
+        With a cache, the request is conditional and None is returned on 304 Not Modified.
+        """
+        session = self._get_session()
+        headers = dict(headers or BROWSER_HEADERS)
+        if cache is not None:
+            headers.update(cache.conditional_headers(cache_key))
+        status = 'error'
+        started = None
+        try:
+            async with self._semaphore:
+                started = time.perf_counter()
+                async with session.get(url, headers=headers, allow_redirects=True) as response:
+                    status = response.status
+                    if response.status == 304 and cache is not None:
+                        return None
+                    body = await response.read()
+                    metrics.inc('tesla_fetch_bytes_total', len(body), 'Inventory page bytes downloaded')
+                    if response.status >= 400:
+                        retry_after = response.headers.get('Retry-After', '')
+                        raise FetchError(
+                            f"HTTP {response.status} for {url}",
+                            status=response.status,
+                            retry_after=int(retry_after) if retry_after.isdigit() else None
+                        )
+                    if cache is not None:
+                        cache.store_validators(cache_key, response.headers)
+                    return body
+        except asyncio.TimeoutError as e:
+            # Before ClientError: aiohttp's ServerTimeoutError is both
+            status = 'timeout'
+            raise FetchError(f"Request timed out for {url}") from e
+        except aiohttp.ClientError as e:
+            raise FetchError(f"Request failed for {url}: {e}") from e
+        finally:
+            if started is not None:
+                metrics.observe('tesla_fetch_seconds', time.perf_counter() - started,
+                                'Inventory page fetch latency by HTTP status', status=status)
+
+    async def close(self):
+        """Close the pooled session and its keep-alive connections"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+class HttpCache:
+    """Conditional-request validators and content digests per inventory target"""
+
+    def __init__(self):
+        self.entries = {}
+        self.stats = {'not_modified': 0, 'same_body': 0, 'same_payload': 0, 'miss': 0}
+
+    def _entry(self, key):
+        return self.entries.setdefault(key, {
+            'etag': None,
+            'last_modified': None,
+            'body_digest': None,
+            'payload_digest': None
+        })
+
+    def conditional_headers(self, key):
+        entry = self._entry(key)
+        headers = {}
+        if entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def store_validators(self, key, response_headers):
+        entry = self._entry(key)
+        entry['etag'] = response_headers.get('ETag')
+        entry['last_modified'] = response_headers.get('Last-Modified')
+
+    def body_unchanged(self, key, body):
+        """Remember the digest of the raw body and report whether it matches the previous one"""
+        entry = self._entry(key)
+        digest = hashlib.sha256(body).hexdigest()
+        unchanged = entry['body_digest'] == digest
+        entry['body_digest'] = digest
+        return unchanged
+
+    def payload_unchanged(self, key, vehicles):
+        """Same as body_unchanged, for the extracted records (ignores markup-only changes)"""
+        entry = self._entry(key)
+        payload = json.dumps([asdict(vehicle) for vehicle in vehicles], sort_keys=True, ensure_ascii=False)
+        digest = hashlib.sha256(payload.encode('utf-8')).hexdigest()
+        unchanged = entry['payload_digest'] == digest
+        entry['payload_digest'] = digest
+        return unchanged
+
+    def count(self, outcome):
+        self.stats[outcome] += 1
+        metrics.inc('tesla_cache_results_total', 1, 'Inventory checks by cache outcome', outcome=outcome)
+
+
+class FetchRecording:
+    """Raw inventory responses captured in production, for replaying offline
+
+    responses.jsonl holds one line per fetch (time, target, url, status, body digest);
+    bodies are stored once per digest under bodies/ as gzip, so weeks of five-minute
+    checks of a mostly unchanged page stay small.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.index_path = os.path.join(directory, 'responses.jsonl')
+        self.bodies_dir = os.path.join(directory, 'bodies')
+
+    def append(self, target, url, status, body=None, error=None, at=None):
+        os.makedirs(self.bodies_dir, exist_ok=True)
+        entry = {'t': round(at or time.time(), 3), 'target': target, 'url': url, 'status': status}
+        if body is not None:
+            digest = hashlib.sha256(body).hexdigest()
+            path = os.path.join(self.bodies_dir, f'{digest}.gz')
+            if not os.path.exists(path):
+                with gzip.open(path + '.tmp', 'wb') as f:
+                    f.write(body)
+                os.replace(path + '.tmp', path)
+            entry['body'] = digest
+            entry['bytes'] = len(body)
+        if error:
+            entry['error'] = error
+        with open(self.index_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+    def entries(self):
+        """Recorded fetches in time order"""
+        with open(self.index_path, 'r', encoding='utf-8') as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+        entries.sort(key=lambda entry: entry['t'])
+        return entries
+
+    def body(self, digest):
+        with gzip.open(os.path.join(self.bodies_dir, f'{digest}.gz'), 'rb') as f:
+            return f.read()
+
+
+class RecordingFetcher:
+    """Wraps an InventoryFetcher and appends every response to a FetchRecording"""
+
+    def __init__(self, fetcher, recording):
+        self.fetcher = fetcher
+        self.recording = recording
+
+    async def fetch(self, url, headers=None, cache=None, cache_key=None):
+        try:
+            body = await self.fetcher.fetch(url, headers=headers, cache=cache, cache_key=cache_key)
+        except FetchError as e:
+            self._append(cache_key or url, url, e.status or 0, error=str(e))
+            raise
+        self._append(cache_key or url, url, 200 if body is not None else 304, body)
+        return body
+
+    def _append(self, *args, **kwargs):
+        try:
+            self.recording.append(*args, **kwargs)
+        except OSError as e:
+            # A full disk must not stop the bot from checking the inventory
+            logger.error(f"Could not record response: {e}")
+
+    async def close(self):
+        await self.fetcher.close()
+
+
+class ReplayFetcher:
+    """Serves a FetchRecording back in order, one recorded response per fetch and target"""
+
+    def __init__(self, recording, entries=None):
+        self.recording = recording
+        self.queues = {}
+        for entry in entries if entries is not None else recording.entries():
+            self.queues.setdefault(entry['target'], collections.deque()).append(entry)
+
+    def peek(self, key):
+        queue = self.queues.get(key)
+        return queue[0] if queue else None
+
+    async def fetch(self, url, headers=None, cache=None, cache_key=None):
+        queue = self.queues.get(cache_key or url)
+        if not queue:
+            raise FetchError(f"No recorded response left for {cache_key or url}")
+        entry = queue.popleft()
+        status = entry['status']
+        if status == 304:
+            return None
+        if 'body' not in entry or status >= 400 or not status:
+            raise FetchError(entry.get('error') or f"HTTP {status} for {url}", status=status or None)
+        return self.recording.body(entry['body'])
+
+    async def close(self):
+        pass
+
+
+# Tesla's inventory data uses short model codes
+MODEL_CODES = {
+    'm3': 'Model 3',
+    'my': 'Model Y',
+    'ms': 'Model S',
+    'mx': 'Model X',
+    'ct': 'Cybertruck'
+}
+
+
+@dataclass(slots=True)
+class VehicleRecord:
+    """A single vehicle found in the inventory (slotted: a scrape can hold thousands)"""
+    id: str
+    model: str
+    details: str
+    url: str
+    vin: Optional[str] = None
+    trim: Optional[str] = None
+    price: Optional[int] = None
+    color: Optional[str] = None
+    location: Optional[str] = None
+
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def _normalize(value):
+    return _WHITESPACE_RE.sub(' ', str(value)).strip().lower() if value is not None else ''
+
+
+def make_vehicle_id(model, vin=None, *fields):
+    """Build a stable vehicle id: the VIN when known, otherwise a digest of the normalized fields"""
+    if vin:
+        return vin.strip().upper()
+    digest = hashlib.sha256('|'.join(_normalize(f) for f in (model,) + fields).encode('utf-8'))
+    return f"{_normalize(model).replace(' ', '-')}-{digest.hexdigest()[:20]}"
+
+
+def format_price(price):
+    """Turkish-style price: 2.499.000 TL"""
+    return f"{price:,} TL".replace(',', '.')
+
+
+def format_age(seconds):
+    """Short Turkish age: 45 saniye, 12 dakika, 3 saat"""
+    seconds = max(0, int(seconds))
+    if seconds < 60:
+        return f"{seconds} saniye"
+    if seconds < 3600:
+        return f"{seconds // 60} dakika"
+    return f"{seconds // 3600} saat"
+
+
+def match_model(text, models):
+    """Return the first monitored model mentioned in text, if any"""
+    text = text.lower()
+    for model in models:
+        if model.lower() in text:
+            return model
+    return None
+
+
+class InventoryExtractor:
+    """Base class for turning a fetched inventory page into vehicle records"""
+    name = 'base'
+    # Cards or inventory entries seen by the last extract() call, before model filtering
+    last_candidates = 0
+
+    def extract(self, content, url, models):
+        raise NotImplementedError
+
+
+class JsonInventoryExtractor(InventoryExtractor):
+    """Read vehicles from the inventory API response or the state blob embedded in the page"""
+    name = 'json'
+
+    # Script tags carrying JSON state, and `window.X = {...}` style assignments
+    SCRIPT_JSON_RE = re.compile(
+        rb'<script[^>]*type=["\']application/(?:ld\+)?json["\'][^>]*>(.*?)</script>',
+        re.DOTALL | re.IGNORECASE
+    )
+    STATE_ASSIGN_RE = re.compile(
+        rb'(?:window\.)?(?:__INITIAL_STATE__|__PRELOADED_STATE__|__NEXT_DATA__|tesla)\s*=\s*(?=[{\[])'
+    )
+    PRICE_FIELDS = ('InventoryPrice', 'Price', 'PurchasePrice', 'TotalPrice')
+    LOCATION_FIELDS = ('City', 'MetroName', 'StateProvince')
+
+    def _json_documents(self, content):
+        """Yield every JSON document found in the response body"""
+        stripped = content.lstrip()
+        if stripped[:1] in (b'{', b'['):
+            try:
+                yield json.loads(stripped)
+            except ValueError:
+                pass
+            return
+
+        for match in self.SCRIPT_JSON_RE.finditer(content):
+            try:
+                yield json.loads(match.group(1))
+            except ValueError:
+                continue
+
+        decoder = json.JSONDecoder()
+        for match in self.STATE_ASSIGN_RE.finditer(content):
+            try:
+                text = content[match.end():].decode('utf-8', errors='replace')
+                document, _ = decoder.raw_decode(text)
+                yield document
+            except ValueError:
+                continue
+
+    def _vehicle_dicts(self, document):
+        """Walk a JSON document and yield every object that looks like an inventory entry"""
+        stack = [document]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, dict):
+                if 'VIN' in node or 'vin' in node:
+                    yield node
+                    continue
+                stack.extend(node.values())
+            elif isinstance(node, list):
+                stack.extend(reversed(node))
+
+    @staticmethod
+    def _text(value):
+        """Flatten list/str fields (Tesla uses both) into a display string"""
+        if isinstance(value, list):
+            return ', '.join(str(v) for v in value if v)
+        return str(value) if value not in (None, '') else None
+
+    def _first(self, entry, fields):
+        for field in fields:
+            value = entry.get(field)
+            if value not in (None, '', []):
+                return value
+        return None
+
+    def _to_record(self, entry, url, models):
+        vin = entry.get('VIN') or entry.get('vin')
+        model_code = str(entry.get('Model') or entry.get('model') or '')
+        model_name = MODEL_CODES.get(model_code.lower(), model_code)
+        trim = self._text(entry.get('TrimName') or entry.get('TRIM') or entry.get('trim'))
+
+        model_found = match_model(f"{model_name} {trim or ''}", models)
+        if not model_found:
+            return None
+
+        price = self._first(entry, self.PRICE_FIELDS)
+        try:
+            price = int(float(price)) if price is not None else None
+        except (TypeError, ValueError):
+            price = None
+        color = self._text(entry.get('PAINT') or entry.get('Paint') or entry.get('color'))
+        location = self._text(self._first(entry, self.LOCATION_FIELDS))
+
+        details = ' · '.join(
+            part for part in (
+                trim,
+                color,
+                format_price(price) if price else None,
+                location,
+                vin
+            ) if part
+        )
+
+        return VehicleRecord(
+            id=make_vehicle_id(model_found, vin),
+            model=model_found,
+            details=details[:200],
+            url=url,
+            vin=vin,
+            trim=trim,
+            price=price,
+            color=color,
+            location=location
+        )
+
+    def extract(self, content, url, models):
+        vehicles = []
+        seen = set()
+        for document in self._json_documents(content):
+            for entry in self._vehicle_dicts(document):
+                vin = entry.get('VIN') or entry.get('vin')
+                if not vin or vin in seen:
+                    continue
+                seen.add(vin)
+                record = self._to_record(entry, url, models)
+                if record:
+                    vehicles.append(record)
+            if vehicles:
+                break
+        self.last_candidates = len(seen)
+        return vehicles
+
+
+class HtmlCardExtractor(InventoryExtractor):
+    """Fallback scraper that looks for vehicle cards in the rendered HTML"""
+    name = 'html'
+
+    # Tesla's structure may change, so try multiple selectors
+    SELECTORS = [
+        'div[data-testid*="vehicle"]',
+        'article[data-testid*="vehicle"]',
+        '.vehicle-card',
+        '.inventory-card',
+        '[class*="vehicle"]',
+        '[class*="inventory"]'
+    ]
+
+    # Scripts, styles and inline icons never hold card text but make up most of the page
+    NON_CONTENT_RE = re.compile(rb'<(script|style|svg)\b.*?</\1\s*>', re.S | re.I)
+    # Cards carry the VIN in their markup (data-testid="vehicle-card-<VIN>", /order/<VIN> links)
+    VIN_RE = re.compile(r'(?<![A-Z0-9])(?=[0-9]*[A-HJ-NPR-Z])[A-HJ-NPR-Z0-9]{17}(?![A-Z0-9])')
+
+    def extract(self, content, url, models):
+        # Only needed when the JSON extractor comes up empty, so keep it out of startup
+        from bs4 import BeautifulSoup
+
+        soup = BeautifulSoup(self.NON_CONTENT_RE.sub(b'', content), 'html.parser')
+        try:
+            return self._extract_cards(soup, url, models)
+        finally:
+            # Break the tree's parent/child cycles now instead of waiting for a full GC pass;
+            # decompose() on the soup itself stops at the root, so start from its children
+            for element in soup.find_all(True, recursive=False):
+                element.decompose()
+            soup.decompose()
+
+    def _extract_cards(self, soup, url, models):
+        vehicle_cards = []
+        for selector in self.SELECTORS:
+            cards = soup.select(selector)
+            if cards:
+                vehicle_cards.extend(cards)
+                logger.debug(f"Found {len(cards)} cards with selector: {selector}")
+
+        # If no specific selectors work, try broader approach
+        if not vehicle_cards:
+            vehicle_cards = soup.find_all(['div', 'article'], class_=lambda x: x and any(
+                keyword in str(x).lower() for keyword in ['vehicle', 'car', 'inventory', 'product']
+            ))
+
+        logger.info(f"Found {len(vehicle_cards)} potential vehicle cards")
+
+        # Broad selectors match a card, its children and the containers around several
+        # cards; decide from all matches at once, not from the order they were found in
+        candidates = {id(card): card for card in vehicle_cards}
+        texts = {key: card.get_text(strip=True) for key, card in candidates.items()}
+        mentions = {key for key, text in texts.items() if match_model(text, models)}
+
+        def candidate_parents(card):
+            return [id(parent) for parent in card.parents if id(parent) in candidates]
+
+        # A candidate holding repeats of the same element that mentions a model (same tag
+        # and classes) is a list of cars; a card's title and trim differ from each other
+        repeats = collections.Counter()
+        for key in mentions:
+            card = candidates[key]
+            shape = (card.name, tuple(card.get('class') or ()))
+            repeats.update((parent, shape) for parent in candidate_parents(card))
+        containers = {parent for (parent, _), count in repeats.items() if count > 1}
+
+        # Of the rest, the outermost match is the card; its matching children are parts of it
+        cards = [
+            (key, card) for key, card in candidates.items()
+            if key not in containers
+            and not any(parent not in containers for parent in candidate_parents(card))
+        ]
+        vehicles = []
+        for key, card in cards:
+            try:
+                # Extract vehicle information
+                text_content = texts[key]
+
+                # Check if any of our monitored models are mentioned
+                model_found = match_model(text_content, models)
+                if model_found:
+                    # Cars with the same visible text only differ by VIN; the text digest is the fallback
+                    vin = self._card_vin(card)
+                    vehicles.append(VehicleRecord(
+                        id=make_vehicle_id(model_found, vin, text_content),
+                        model=model_found,
+                        details=text_content[:200],  # First 200 chars
+                        url=url,
+                        vin=vin
+                    ))
+                    logger.debug(f"Found vehicle: {model_found}")
+
+            except Exception as e:
+                logger.debug(f"Error parsing vehicle card: {e}")
+                continue
+
+        self.last_candidates = len(cards)
+
+        # If no vehicles found, log page content for debugging (first 500 chars)
+        if not vehicles:
+            logger.debug(f"No vehicles found. Page content preview: {soup.get_text()[:500]}")
+
+        return vehicles
+
+    def _card_vin(self, card):
+        """First VIN found in the attributes of the card or its descendants, if any"""
+        for element in [card, *card.find_all(True)]:
+            for value in element.attrs.values():
+                for item in value if isinstance(value, list) else [value]:
+                    match = self.VIN_RE.search(item)
+                    if match:
+                        return match.group()
+        return None
+
+
+class ExtractorChain:
+    """Try extractors cheapest-first and keep the first non-empty result"""
+
+    def __init__(self, extractors, smoothing=0.3, probe_every=10):
+        self.extractors = list(extractors)
+        self.smoothing = smoothing
+        self.probe_every = probe_every
+        self.calls = 0
+        self.avg_cost = {extractor.name: None for extractor in self.extractors}
+        self.last_hit = {extractor.name: True for extractor in self.extractors}
+
+    def _order(self):
+        # Extractors that produced vehicles last time come first, then by average cost;
+        # the configured order is used until timings are known. Every few calls misses
+        # are ignored so a cheaper extractor that starts working again gets picked up.
+        probe = self.calls % self.probe_every == 0
+        return sorted(
+            enumerate(self.extractors),
+            key=lambda item: (
+                not probe and not self.last_hit[item[1].name],
+                self.avg_cost[item[1].name] is None,
+                self.avg_cost[item[1].name] or 0.0,
+                item[0]
+            )
+        )
+
+    def _record(self, name, elapsed, hit):
+        previous = self.avg_cost[name]
+        self.avg_cost[name] = elapsed if previous is None else (
+            self.smoothing * elapsed + (1 - self.smoothing) * previous
+        )
+        self.last_hit[name] = hit
+
+    def _apply(self, attempts):
+        """Update timings and metrics from the attempts a parse worker reports back"""
+        for name, elapsed, kept, candidates in attempts:
+            self._record(name, elapsed, bool(kept))
+            metrics.observe('tesla_extract_seconds', elapsed, 'Time spent in each extractor',
+                            extractor=name, hit=str(bool(kept)).lower())
+            metrics.inc('tesla_extract_candidates_total', candidates,
+                        'Vehicle cards or inventory entries found before model filtering', extractor=name)
+            metrics.inc('tesla_extract_vehicles_total', kept,
+                        'Vehicles kept after model filtering', extractor=name)
+            logger.debug(f"Extractor {name} returned {kept} vehicles in {elapsed * 1000:.1f} ms")
+
+    def extract(self, content, url, models):
+        """Return (extractor name, vehicles) from the first extractor that finds vehicles"""
+        self.calls += 1
+        order = [extractor for _, extractor in self._order()]
+        name, vehicles, attempts = run_extractors(order, content, url, models)
+        self._apply(attempts)
+        return name, vehicles
+
+    async def extract_async(self, pool, content, url, models):
+        """Same as extract(), with the parsing done by a ParsePool off the event loop"""
+        self.calls += 1
+        order = [extractor for _, extractor in self._order()]
+        name, vehicles, attempts = await pool.run(run_extractors, order, content, url, models)
+        self._apply(attempts)
+        return name, vehicles
+
+
+def run_extractors(extractors, content, url, models):
+    """Try extractors in order until one finds vehicles; runs inside a parse worker
+
+    Returns (extractor name, vehicles, attempts) where attempts holds
+    (name, seconds, vehicles kept, candidates) for every extractor that ran, so the
+    calling process can keep the chain's statistics.
+    """
+    attempts = []
+    for extractor in extractors:
+        extractor.last_candidates = 0
+        started = time.perf_counter()
+        try:
+            vehicles = extractor.extract(content, url, models)
+        except Exception as e:
+            logger.debug(f"Extractor {extractor.name} failed: {e}")
+            vehicles = []
+        attempts.append((extractor.name, time.perf_counter() - started, len(vehicles), extractor.last_candidates))
+        if vehicles:
+            return extractor.name, vehicles, attempts
+    return None, [], attempts
+
+
+class ParseTimeout(Exception):
+    """Raised when a page takes longer than PARSE_TIMEOUT to parse"""
+
+
+class ParsePool:
+    """Runs page parsing off the event loop: in worker processes, in threads, or inline
+
+    Processes parse several targets in parallel on a multi-core Pi; threads cost almost no
+    memory and still keep the event loop responsive, since parsing releases the GIL often.
+    """
+
+    MODES = ('process', 'thread', 'inline')
+
+    def __init__(self, mode='process', workers=None, timeout=60):
+        if mode not in self.MODES:
+            raise ValueError(f"PARSE_EXECUTOR must be one of {', '.join(self.MODES)}, not {mode!r}")
+        if mode == 'process' and 'fork' not in multiprocessing.get_all_start_methods():
+            logger.warning("Process pool parsing needs fork(); parsing in threads instead")
+            mode = 'thread'
+        self.mode = mode
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self.timeout = timeout
+        self._executor = None
+        if mode == 'process':
+            # Fork every worker now, while this is still a single-threaded process without an
+            # event loop; the workers share the already imported modules copy-on-write
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('fork'))
+            self._executor.submit(int).result()
+        elif mode == 'thread':
+            self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='parse')
+
+    async def run(self, func, *args):
+        """Run func(*args) in the pool, raising ParseTimeout after `timeout` seconds
+
+        Cancelling the caller drops a job that has not started yet; a job already running
+        in a worker finishes there and its result is discarded. A timed-out job in process
+        mode has its workers killed, so one pathological page can't keep them busy.
+        """
+        if self._executor is None:
+            return func(*args)
+        loop = asyncio.get_running_loop()
+        executor = self._executor
+        started = time.perf_counter()
+        try:
+            return await asyncio.wait_for(loop.run_in_executor(executor, func, *args), self.timeout)
+        except asyncio.TimeoutError:
+            metrics.inc('parse_timeouts_total', 1, 'Parses abandoned after PARSE_TIMEOUT')
+            if self.mode == 'process' and executor is self._executor:
+                self._restart_workers()
+            raise ParseTimeout(f"Parsing took longer than {self.timeout} seconds") from None
+        except BrokenProcessPool:
+            if executor is not self._executor:
+                # Its workers were killed after another job timed out; run again in the new pool
+                return await self.run(func, *args)
+            # A worker died, most likely killed by the OOM killer; forking replacements would
+            # only bring the memory back, so carry on with threads
+            logger.error("Parse worker process died, parsing in threads from now on")
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self.mode = 'thread'
+            self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='parse')
+            return await self.run(func, *args)
+        finally:
+            metrics.observe('parse_seconds', time.perf_counter() - started,
+                            'Page parse time including the wait for a free worker', mode=self.mode)
+
+    def _restart_workers(self):
+        """Kill the worker processes, one of which is stuck on a page, and start fresh ones"""
+        logger.warning("Parse timed out, restarting the parse worker processes")
+        processes = list((getattr(self._executor, '_processes', None) or {}).values())
+        for process in processes:
+            process.terminate()
+        # Jobs still queued or running in the old pool fail with BrokenProcessPool and are retried
+        self._executor.shutdown(wait=False)
+        self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('fork'))
+
+    def worker_rss_bytes(self):
+        """Combined resident memory of the worker processes (0 in thread/inline mode)"""
+        total = 0
+        for pid in list(getattr(self._executor, '_processes', None) or ()):
+            try:
+                with open(f'/proc/{pid}/statm', 'r') as f:
+                    total += int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+            except (OSError, ValueError, IndexError):
+                pass
+        return total
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+class TargetScheduler:
+    """Decides when a target is checked next: adaptive interval, jitter, backoff and a circuit breaker"""
+
+    # Consecutive unchanged checks before the interval starts to grow
+    STABLE_CHECKS = 3
+
+    def __init__(self, interval, jitter=0.1, failure_threshold=5, cooldown=1800, max_backoff=3600):
+        self.base_interval = interval
+        self.min_interval = max(30, interval // 4)
+        self.max_interval = interval * 3
+        self.interval = interval
+        self.jitter = jitter
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_backoff = max_backoff
+        self.failures = 0
+        self.stable_checks = 0
+        self.last_error = None
+        self.retry_after = None
+        self.open_until = 0.0
+        self._wakeup = asyncio.Event()
+
+    @property
+    def is_open(self):
+        """True while the circuit breaker keeps the target paused"""
+        return self.open_until > time.time()
+
+    @property
+    def is_backing_off(self):
+        """True while Tesla's last answer asked us to slow down (403/429/5xx)"""
+        return bool(self.failures) and getattr(self.last_error, 'should_back_off', False)
+
+    def record_success(self, changed):
+        self.failures = 0
+        self.last_error = None
+        self.retry_after = None
+        self.open_until = 0.0
+        if changed:
+            # Inventory is moving: look again sooner
+            self.stable_checks = 0
+            self.interval = max(self.min_interval, self.interval // 2)
+        else:
+            self.stable_checks += 1
+            if self.stable_checks >= self.STABLE_CHECKS:
+                self.interval = min(self.max_interval, int(self.interval * 1.5))
+
+    def record_failure(self, error):
+        self.failures += 1
+        self.last_error = error
+        self.retry_after = getattr(error, 'retry_after', None)
+        if self.failures >= self.failure_threshold:
+            self.open_until = time.time() + self.cooldown
+            logger.warning(f"Circuit breaker opened after {self.failures} failures, pausing for {self.cooldown} seconds")
+
+    def reset(self):
+        """Close the breaker and forget failures (e.g. on /basla)"""
+        self.failures = 0
+        self.last_error = None
+        self.retry_after = None
+        self.open_until = 0.0
+        self.interval = self.base_interval
+        self.stable_checks = 0
+
+    def next_delay(self):
+        """Seconds until the next check"""
+        if self.is_open:
+            return self.open_until - time.time()
+        delay = self.interval
+        if self.is_backing_off:
+            delay = min(self.max_backoff, self.base_interval * 2 ** self.failures)
+        if self.retry_after:
+            delay = max(delay, self.retry_after)
+        # Spread checks so several targets (or several bots) don't hit Tesla in lockstep
+        return max(1.0, delay * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    def wake(self):
+        self._wakeup.set()
+
+    async def sleep(self, delay=None):
+        """Sleep for `delay` seconds (forever if None) or until woken"""
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+
+# Name of the single inventory target built from TESLA_URL / MODELS / CHECK_INTERVAL
+DEFAULT_TARGET = 'default'
+
+
+class InventoryTarget:
+    """One inventory feed to watch, with its own model filter, interval and extractor state"""
+
+    def __init__(self, name, url, models, interval, **scheduler_options):
+        self.name = name
+        self.url = url
+        self.models = models
+        self.interval = interval
+        self.extractors = ExtractorChain([JsonInventoryExtractor(), HtmlCardExtractor()])
+        self.scheduler = TargetScheduler(interval, **scheduler_options)
+        # Records from the last successful extraction, reused when the page is unchanged
+        self.vehicles = []
+        # When the records above were last confirmed against the site (0 = never)
+        self.fetched_at = 0.0
+        # Set when a fetch found changed records that check_inventory has not diffed yet
+        self.pending_diff = False
+        # The fetch in progress; everyone asking for this target meanwhile awaits it
+        self.inflight = None
+
+
+def load_targets(default_url, default_models, default_interval, **scheduler_options):
+    """Read INVENTORY_TARGETS (a JSON list) or fall back to a single target from TESLA_URL
+
+    scheduler_options (jitter, circuit breaker settings) apply to every target's scheduler.
+    """
+    raw = os.getenv('INVENTORY_TARGETS')
+    if not raw:
+        return [InventoryTarget(DEFAULT_TARGET, default_url, default_models, default_interval, **scheduler_options)]
+
+    targets = []
+    for i, entry in enumerate(json.loads(raw), 1):
+        if isinstance(entry, str):
+            entry = {'url': entry}
+        targets.append(InventoryTarget(
+            name=entry.get('name') or f"hedef-{i}",
+            url=entry['url'],
+            models=entry.get('models') or default_models,
+            interval=int(entry.get('interval') or default_interval),
+            **scheduler_options
+        ))
+
+    names = [target.name for target in targets]
+    if len(set(names)) != len(names):
+        raise ValueError(f"INVENTORY_TARGETS names must be unique: {names}")
+    return targets
+
+
+@dataclass(slots=True)
+class VehicleChange:
+    """A listed vehicle whose attributes changed between two scrapes"""
+    vehicle: VehicleRecord
+    # Changed field name -> value before the change
+    previous: dict
+
+
+@dataclass(slots=True)
+class ScrapeDiff:
+    """Result of applying one scrape to the inventory store"""
+    added: list
+    returned: list
+    removed: list
+    changed: list
+
+
+# Event kinds of a ScrapeDiff, in the order handlers are called
+DIFF_EVENTS = ('added', 'returned', 'removed', 'changed')
+
+# Vehicle fields reported in change notifications, with their Turkish labels
+CHANGE_LABELS = {
+    'model': 'model',
+    'trim': 'donanım',
+    'price': 'fiyat',
+    'color': 'renk',
+    'location': 'konum'
+}
+
+
+# Turkish color names users are likely to type, mapped to the words Tesla uses
+COLOR_ALIASES = {
+    'beyaz': 'white',
+    'siyah': 'black',
+    'gri': 'gray',
+    'gumus': 'silver',
+    'mavi': 'blue',
+    'kirmizi': 'red'
+}
+
+# Keys accepted by /abone and the Subscription field they set
+SUBSCRIPTION_KEYS = {
+    'model': 'model',
+    'donanim': 'trim',
+    'fiyat': 'max_price',
+    'renk': 'color',
+    'sehir': 'city'
+}
+
+# Subscriptions are cheap to match but each one can mean a message per scrape
+MAX_SUBSCRIPTIONS_PER_CHAT = 10
+
+# /manuel-arama yenile doesn't fetch a target again if it was fetched this recently
+MANUAL_REFRESH_MIN_AGE = 30
+
+_SUBSCRIPTION_ARG_RE = re.compile(r'(\w+)\s*=')
+
+
+def _fold(value):
+    """Normalize and strip accents so 'İstanbul', 'istanbul' and 'Istanbul' compare equal"""
+    value = _normalize(value).replace('ı', 'i')
+    return ''.join(c for c in unicodedata.normalize('NFKD', value) if not unicodedata.combining(c))
+
+
+@dataclass(slots=True)
+class Subscription:
+    """Filters one chat registered for new-vehicle notifications; None matches anything"""
+    id: Optional[int]
+    chat_id: str
+    model: Optional[str] = None
+    trim: Optional[str] = None
+    max_price: Optional[int] = None
+    color: Optional[str] = None
+    city: Optional[str] = None
+
+    def describe(self):
+        parts = []
+        if self.model:
+            parts.append(self.model)
+        if self.trim:
+            parts.append(self.trim)
+        if self.color:
+            parts.append(self.color)
+        if self.city:
+            parts.append(self.city)
+        if self.max_price:
+            parts.append(f"en fazla {format_price(self.max_price)}")
+        return ', '.join(parts) or 'tüm araçlar'
+
+
+def parse_subscription(chat_id, text, models):
+    """Build a Subscription from `model=Model Y renk=beyaz fiyat=2500000 ...`, raising ValueError"""
+    parts = _SUBSCRIPTION_ARG_RE.split(text.strip())
+    if parts[0].strip():
+        raise ValueError(f"Anlaşılamadı: {parts[0].strip()}")
+
+    subscription = Subscription(id=None, chat_id=str(chat_id))
+    for key, value in zip(parts[1::2], parts[2::2]):
+        field = SUBSCRIPTION_KEYS.get(_fold(key))
+        value = value.strip()
+        if field is None:
+            raise ValueError(f"Bilinmeyen filtre: {key}")
+        if not value:
+            raise ValueError(f"{key} için değer girilmedi")
+
+        if field == 'model':
+            value = MODEL_CODES.get(value.lower(), value)
+            value = match_model(value, models) or next(
+                (model for model in models if _fold(model) == _fold(f"model {value}")), None
+            )
+            if value is None:
+                raise ValueError(f"Takip edilmeyen model. Takip edilenler: {', '.join(models)}")
+        elif field == 'max_price':
+            try:
+                value = int(re.sub(r'[^\d]', '', value))
+            except ValueError:
+                raise ValueError(f"Geçersiz fiyat: {value}") from None
+        elif field == 'color':
+            value = COLOR_ALIASES.get(_fold(value), value)
+        setattr(subscription, field, value)
+    return subscription
+
+
+class SubscriptionIndex:
+    """Inverted index from filter values to subscriptions
+
+    A new vehicle is matched by looking up its model, color and city in the index and
+    intersecting the posting sets (plus the subscriptions that leave a field open), so the
+    cost grows with the number of subscriptions that could match, not with all of them.
+    """
+
+    # Subscription field -> VehicleRecord attribute, most selective first
+    INDEXED = (('model', 'model'), ('city', 'location'), ('color', 'color'))
+
+    def __init__(self, subscriptions=()):
+        self.subscriptions = {}
+        # field -> index key -> subscription ids; the None key holds subscriptions without that filter
+        self._postings = {field: {} for field, _ in self.INDEXED}
+        for subscription in subscriptions:
+            self.add(subscription)
+
+    @staticmethod
+    def _keys(field, value):
+        folded = _fold(value)
+        if field == 'model':
+            return {folded}
+        # Colors and cities match on any word, e.g. 'white' in 'Pearl White Multi-Coat'
+        return {folded} | set(folded.split())
+
+    def add(self, subscription):
+        self.subscriptions[subscription.id] = subscription
+        for field, _ in self.INDEXED:
+            value = getattr(subscription, field)
+            key = _fold(value) if value else None
+            self._postings[field].setdefault(key, set()).add(subscription.id)
+
+    def remove(self, subscription_id):
+        subscription = self.subscriptions.pop(subscription_id, None)
+        if subscription is None:
+            return
+        for field, _ in self.INDEXED:
+            value = getattr(subscription, field)
+            key = _fold(value) if value else None
+            postings = self._postings[field].get(key)
+            if postings is not None:
+                postings.discard(subscription_id)
+                if not postings:
+                    del self._postings[field][key]
+
+    def __len__(self):
+        return len(self.subscriptions)
+
+    def chat_count(self):
+        return len({subscription.chat_id for subscription in self.subscriptions.values()})
+
+    def match(self, vehicle):
+        """Subscriptions whose filters all accept `vehicle`"""
+        candidates = None
+        for field, attr in self.INDEXED:
+            postings = self._postings[field]
+            ids = set(postings.get(None, ()))
+            value = getattr(vehicle, attr)
+            if value:
+                for key in self._keys(field, value):
+                    ids.update(postings.get(key, ()))
+            candidates = ids if candidates is None else candidates & ids
+            if not candidates:
+                return []
+
+        matches = []
+        for subscription_id in candidates:
+            subscription = self.subscriptions[subscription_id]
+            if subscription.max_price is not None and (vehicle.price is None or vehicle.price > subscription.max_price):
+                continue
+            if subscription.trim and _fold(subscription.trim) not in _fold(vehicle.trim or vehicle.details):
+                continue
+            matches.append(subscription)
+        return matches
+
+    def fan_out(self, vehicles):
+        """Map each subscribed chat to the vehicles it should hear about, in scrape order"""
+        per_chat = {}
+        for vehicle in vehicles:
+            for chat_id in {subscription.chat_id for subscription in self.match(vehicle)}:
+                per_chat.setdefault(chat_id, []).append(vehicle)
+        return per_chat
+
+
+class InventoryStore:
+    """SQLite (WAL) store of seen vehicles with first/last-seen times and attribute snapshots"""
+
+    # Kept in PRAGMA user_version; bump it when the tables change shape
+    SCHEMA_VERSION = 1
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS vehicles (
+            target TEXT NOT NULL,
+            id TEXT NOT NULL,
+            model TEXT NOT NULL,
+            first_seen REAL NOT NULL,
+            last_seen REAL NOT NULL,
+            removed_at REAL,
+            attrs_hash TEXT NOT NULL,
+            attrs TEXT NOT NULL,
+            PRIMARY KEY (target, id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_vehicles_first_seen ON vehicles (first_seen);
+        CREATE INDEX IF NOT EXISTS idx_vehicles_removed_at ON vehicles (removed_at);
+        CREATE TABLE IF NOT EXISTS snapshots (
+            target TEXT NOT NULL,
+            vehicle_id TEXT NOT NULL,
+            seen_at REAL NOT NULL,
+            attrs TEXT NOT NULL,
+            PRIMARY KEY (target, vehicle_id, seen_at)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id TEXT NOT NULL,
+            text TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS subscriptions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id TEXT NOT NULL,
+            model TEXT,
+            trim TEXT,
+            max_price INTEGER,
+            color TEXT,
+            city TEXT,
+            created_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_subscriptions_chat ON subscriptions (chat_id);
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        # NORMAL is durable enough in WAL mode and saves an fsync per commit on SD cards
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(self.SCHEMA)
+        self.conn.execute(f'PRAGMA user_version={self.SCHEMA_VERSION}')
+        # Active vehicles and their attribute hashes per target, kept in memory so a
+        # scrape only touches rows that actually changed
+        self._active = {}
+        # Time of the latest scrape per target, including unchanged ones that are not written
+        self._last_scrape = {}
+        for row in self.conn.execute('SELECT target, id, attrs_hash FROM vehicles WHERE removed_at IS NULL'):
+            self._active.setdefault(row['target'], {})[row['id']] = row['attrs_hash']
+
+    def get_meta(self, key, default=None):
+        row = self.conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row['value'] if row else default
+
+    def set_meta(self, key, value):
+        with self.conn:
+            self.conn.execute(
+                'INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value',
+                (key, value)
+            )
+
+    @staticmethod
+    def _attrs(vehicle):
+        attrs = json.dumps(asdict(vehicle), ensure_ascii=False, sort_keys=True)
+        return attrs, hashlib.sha1(attrs.encode('utf-8')).hexdigest()
+
+    def active_count(self, target=None):
+        if target is not None:
+            return len(self._active.get(target, {}))
+        return sum(len(active) for active in self._active.values())
+
+    def retire_legacy_json(self, data_file):
+        """Set aside the old last_inventory.json; returns True when there was one
+
+        Its ids were built from Python's per-process randomized hash() and cannot be mapped
+        to stable ids, so the target is re-baselined silently from the next scrape instead.
+        """
+        if not os.path.exists(data_file):
+            return False
+        os.replace(data_file, data_file + '.migrated')
+        logger.info(f"Retired legacy inventory cache {data_file}")
+        return True
+
+    def apply_scrape(self, target, vehicles, now=None):
+        """Upsert one scrape of a target and return which vehicles were added, came back or were removed"""
+        now = now or time.time()
+        scrape_key = f'last_scrape_at:{target}'
+        previous_scrape = self._last_scrape.get(target) or float(self.get_meta(scrape_key, now))
+        self._last_scrape[target] = now
+        active = self._active.setdefault(target, {})
+
+        current = {}
+        for vehicle in vehicles:
+            current.setdefault(vehicle.id, vehicle)
+
+        appeared = [vehicle_id for vehicle_id in current if vehicle_id not in active]
+        known = {row['id'] for row in self._select_ids('SELECT id FROM vehicles', target, appeared)}
+
+        diff = ScrapeDiff(added=[], returned=[], removed=[], changed=[])
+        inserts, reactivations, updates, snapshots = [], [], [], []
+        changed = []
+        for vehicle_id, vehicle in current.items():
+            attrs, attrs_hash = self._attrs(vehicle)
+            if vehicle_id not in active:
+                if vehicle_id in known:
+                    diff.returned.append(vehicle)
+                    reactivations.append((vehicle.model, now, attrs_hash, attrs, target, vehicle_id))
+                else:
+                    diff.added.append(vehicle)
+                    inserts.append((target, vehicle_id, vehicle.model, now, now, attrs_hash, attrs))
+            elif active[vehicle_id] != attrs_hash:
+                updates.append((vehicle.model, attrs_hash, attrs, target, vehicle_id))
+                changed.append(vehicle)
+            else:
+                continue
+            snapshots.append((target, vehicle_id, now, attrs))
+            active[vehicle_id] = attrs_hash
+
+        removed_ids = [vehicle_id for vehicle_id in active if vehicle_id not in current]
+        diff.removed.extend(removed_ids)
+        for vehicle_id in removed_ids:
+            del active[vehicle_id]
+
+        # Only records whose hash moved are compared field by field, against the stored row
+        previous = {
+            row['id']: json.loads(row['attrs'])
+            for row in self._select_ids('SELECT id, attrs FROM vehicles', target, [v.id for v in changed])
+        }
+        for vehicle in changed:
+            old = previous.get(vehicle.id, {})
+            fields = {name: old.get(name) for name, value in asdict(vehicle).items()
+                      if name != 'id' and old.get(name) != value}
+            if fields:
+                diff.changed.append(VehicleChange(vehicle, fields))
+
+        with self.conn:
+            self.conn.executemany(
+                'INSERT INTO vehicles (target, id, model, first_seen, last_seen, attrs_hash, attrs) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                inserts
+            )
+            self.conn.executemany(
+                'UPDATE vehicles SET model = ?, removed_at = NULL, last_seen = ?, attrs_hash = ?, attrs = ? '
+                'WHERE target = ? AND id = ?',
+                reactivations
+            )
+            self.conn.executemany(
+                'UPDATE vehicles SET model = ?, attrs_hash = ?, attrs = ? WHERE target = ? AND id = ?',
+                updates
+            )
+            # last_seen of active vehicles is implied by last_scrape_at, so it is only
+            # written when a vehicle disappears
+            self.conn.executemany(
+                'UPDATE vehicles SET removed_at = ?, last_seen = ? WHERE target = ? AND id = ?',
+                [(now, previous_scrape, target, vehicle_id) for vehicle_id in removed_ids]
+            )
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO snapshots (target, vehicle_id, seen_at, attrs) VALUES (?, ?, ?, ?)',
+                snapshots
+            )
+            self.conn.execute(
+                'INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value',
+                (scrape_key, str(now))
+            )
+        return diff
+
+    def _select_ids(self, query, target, ids):
+        """Run `query WHERE target = ? AND id IN (...)` in chunks below SQLite's parameter limit"""
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            placeholders = ','.join('?' * len(chunk))
+            yield from self.conn.execute(f'{query} WHERE target = ? AND id IN ({placeholders})', [target] + chunk)
+
+    def mark_unchanged(self, target, now=None):
+        """Note a scrape that matched the stored inventory without writing to disk"""
+        self._last_scrape[target] = now or time.time()
+
+    def new_since(self, since):
+        """Vehicles first seen at or after `since`"""
+        return self.conn.execute(
+            'SELECT * FROM vehicles WHERE first_seen >= ? ORDER BY first_seen DESC', (since,)
+        ).fetchall()
+
+    def removed_since(self, since):
+        """Vehicles removed from the inventory at or after `since`"""
+        return self.conn.execute(
+            'SELECT * FROM vehicles WHERE removed_at >= ? ORDER BY removed_at DESC', (since,)
+        ).fetchall()
+
+    def enqueue_messages(self, chat_id, texts):
+        """Persist outgoing messages so they survive a restart"""
+        self.enqueue_batch((chat_id, text) for text in texts)
+
+    def enqueue_batch(self, messages):
+        """Persist (chat_id, text) pairs for many chats in one transaction"""
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                'INSERT INTO outbox (chat_id, text, created_at) VALUES (?, ?, ?)',
+                [(str(chat_id), text, now) for chat_id, text in messages]
+            )
+
+    def pending_messages(self, limit=50, skip_chats=()):
+        skip_chats = list(skip_chats)
+        placeholders = ','.join('?' * len(skip_chats))
+        return self.conn.execute(
+            f'SELECT id, chat_id, text, attempts FROM outbox WHERE chat_id NOT IN ({placeholders}) '
+            'ORDER BY id LIMIT ?', (*skip_chats, limit)
+        ).fetchall()
+
+    def pending_count(self):
+        return self.conn.execute('SELECT COUNT(*) FROM outbox').fetchone()[0]
+
+    def delete_message(self, message_id):
+        with self.conn:
+            self.conn.execute('DELETE FROM outbox WHERE id = ?', (message_id,))
+
+    def record_attempt(self, message_id):
+        with self.conn:
+            self.conn.execute('UPDATE outbox SET attempts = attempts + 1 WHERE id = ?', (message_id,))
+
+    def add_subscription(self, subscription):
+        """Store a subscription and return it with its new id"""
+        with self.conn:
+            cursor = self.conn.execute(
+                'INSERT INTO subscriptions (chat_id, model, trim, max_price, color, city, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (str(subscription.chat_id), subscription.model, subscription.trim, subscription.max_price,
+                 subscription.color, subscription.city, time.time())
+            )
+        subscription.id = cursor.lastrowid
+        return subscription
+
+    def subscriptions(self, chat_id=None):
+        query = 'SELECT id, chat_id, model, trim, max_price, color, city FROM subscriptions'
+        if chat_id is None:
+            rows = self.conn.execute(query + ' ORDER BY id')
+        else:
+            rows = self.conn.execute(query + ' WHERE chat_id = ? ORDER BY id', (str(chat_id),))
+        return [Subscription(**dict(row)) for row in rows]
+
+    def get_vehicle(self, target, vehicle_id):
+        return self.conn.execute(
+            'SELECT * FROM vehicles WHERE target = ? AND id = ?', (target, vehicle_id)
+        ).fetchone()
+
+    def remove_subscriptions(self, chat_id, subscription_id=None):
+        """Delete one subscription of a chat, or all of them; returns the deleted ids"""
+        query = 'SELECT id FROM subscriptions WHERE chat_id = ?'
+        params = [str(chat_id)]
+        if subscription_id is not None:
+            query += ' AND id = ?'
+            params.append(subscription_id)
+        ids = [row['id'] for row in self.conn.execute(query, params)]
+        with self.conn:
+            self.conn.executemany('DELETE FROM subscriptions WHERE id = ?', [(i,) for i in ids])
+        return ids
+
+    def close(self):
+        self.conn.close()
+
+
+@dataclass(slots=True)
+class PriceDrop:
+    """A listed vehicle whose price went down between two scrapes"""
+    target: str
+    vehicle_id: str
+    old_price: int
+    new_price: int
+    at: float
+
+
+class PriceHistory:
+    """Append-only price and availability history in a compact binary layout
+
+    Only changes are written, so a vehicle listed for months at one price costs two records.
+    Each record is 13 bytes: time (u32), key (u32), price (i32, -1 when unknown), status (u8).
+
+    keys.txt     one "target<TAB>vehicle id" per line; the line number is the key
+    wal.bin      records appended as scrapes happen
+    segment.bin  compacted records sorted by (key, time), followed by a (key, first, count)
+                 index and a footer pointing at it, so one vehicle is read with a single seek
+    """
+
+    RECORD = struct.Struct('<IIiB')
+    INDEX_ENTRY = struct.Struct('<III')
+    FOOTER = struct.Struct('<II')
+    MAGIC = b'TSH1'
+    LISTED = 1
+    REMOVED = 0
+    # Fold the WAL into the segment once it holds this many records
+    COMPACT_EVERY = 5000
+
+    def __init__(self, directory, retention_days=365):
+        self.directory = directory
+        self.retention = retention_days * 86400
+        os.makedirs(directory, exist_ok=True)
+        self.keys_path = os.path.join(directory, 'keys.txt')
+        self.wal_path = os.path.join(directory, 'wal.bin')
+        self.segment_path = os.path.join(directory, 'segment.bin')
+
+        self.keys = []
+        self._key_ids = {}
+        self._load_keys()
+        # Last (price, status) per key and the listed keys per target, to detect changes
+        self._state = {}
+        self._listed = {}
+        self._index = {}
+        self._load_segment_index()
+        self._open_wal()
+        for key, records in self._runs():
+            self._remember(key, records[-1])
+
+    def _load_keys(self):
+        if not os.path.exists(self.keys_path):
+            open(self.keys_path, 'a').close()
+        with open(self.keys_path, 'r+', encoding='utf-8') as f:
+            data = f.read()
+            # Drop a line cut short by a crash
+            if data and not data.endswith('\n'):
+                data = data[:data.rfind('\n') + 1]
+                f.seek(0)
+                f.write(data)
+                f.truncate()
+        for line in data.splitlines():
+            target, _, vehicle_id = line.partition('\t')
+            self._key_ids[(target, vehicle_id)] = len(self.keys)
+            self.keys.append((target, vehicle_id))
+        self._keys_file = open(self.keys_path, 'a', encoding='utf-8')
+
+    def _key(self, target, vehicle_id):
+        key = self._key_ids.get((target, vehicle_id))
+        if key is None:
+            key = self._key_ids[(target, vehicle_id)] = len(self.keys)
+            self.keys.append((target, vehicle_id))
+            self._keys_file.write(f"{target}\t{vehicle_id}\n")
+            self._keys_file.flush()
+        return key
+
+    def _open_wal(self):
+        size = os.path.getsize(self.wal_path) if os.path.exists(self.wal_path) else 0
+        self._wal = open(self.wal_path, 'ab')
+        # Cut off a record that was only partly written
+        if size % self.RECORD.size:
+            self._wal.truncate(size - size % self.RECORD.size)
+        self.wal_records = size // self.RECORD.size
+
+    def _load_segment_index(self):
+        self._index = {}
+        if not os.path.exists(self.segment_path):
+            return
+        with open(self.segment_path, 'rb') as f:
+            if f.read(len(self.MAGIC)) != self.MAGIC:
+                raise ValueError(f"{self.segment_path} is not a price history segment")
+            f.seek(-self.FOOTER.size, os.SEEK_END)
+            index_offset, entries = self.FOOTER.unpack(f.read(self.FOOTER.size))
+            f.seek(index_offset)
+            for key, first, count in self.INDEX_ENTRY.iter_unpack(f.read(entries * self.INDEX_ENTRY.size)):
+                self._index[key] = (first, count)
+
+    def _read_wal(self):
+        """WAL records grouped by key, in time order; the WAL is small by construction"""
+        self._wal.flush()
+        grouped = {}
+        with open(self.wal_path, 'rb') as f:
+            data = f.read(self.wal_records * self.RECORD.size)
+        for record in self.RECORD.iter_unpack(data):
+            grouped.setdefault(record[1], []).append(record)
+        for records in grouped.values():
+            # Stable on time, so two scrapes within the same second keep their order
+            records.sort(key=lambda record: record[0])
+        return grouped
+
+    def _segment_records(self, f, key):
+        first, count = self._index.get(key, (0, 0))
+        if not count:
+            return []
+        f.seek(len(self.MAGIC) + first * self.RECORD.size)
+        return list(self.RECORD.iter_unpack(f.read(count * self.RECORD.size)))
+
+    def _runs(self):
+        """Yield (key, records) for every key, one key in memory at a time"""
+        wal = self._read_wal()
+        with open(self.segment_path, 'rb') if self._index else contextlib.nullcontext() as f:
+            for key in sorted(set(self._index) | set(wal)):
+                records = self._segment_records(f, key) + wal.get(key, [])
+                if records:
+                    yield key, records
+
+    def _remember(self, key, record):
+        _, _, price, status = record
+        target = self.keys[key][0]
+        self._state[key] = (price, status)
+        listed = self._listed.setdefault(target, set())
+        if status == self.LISTED:
+            listed.add(key)
+        else:
+            listed.discard(key)
+
+    def record_scrape(self, target, vehicles, now=None):
+        """Append price/status changes for one scrape and return the price drops"""
+        now = int(now or time.time())
+        records = []
+        drops = []
+        seen = set()
+        for vehicle in vehicles:
+            key = self._key(target, vehicle.id)
+            if key in seen:
+                continue
+            seen.add(key)
+            price = vehicle.price if vehicle.price is not None else -1
+            previous = self._state.get(key)
+            if previous == (price, self.LISTED):
+                continue
+            if previous and previous[1] == self.LISTED and 0 < price < previous[0]:
+                drops.append(PriceDrop(target, vehicle.id, previous[0], price, now))
+            records.append((now, key, price, self.LISTED))
+        for key in self._listed.get(target, set()) - seen:
+            records.append((now, key, self._state[key][0], self.REMOVED))
+
+        if records:
+            self._wal.write(b''.join(self.RECORD.pack(*record) for record in records))
+            self._wal.flush()
+            self.wal_records += len(records)
+            for record in records:
+                self._remember(record[1], record)
+        if self.wal_records >= self.COMPACT_EVERY:
+            self.compact(now)
+        return drops
+
+    def compact(self, now=None):
+        """Merge the WAL into a new segment, dropping repeats and long-gone vehicles"""
+        now = now or time.time()
+        tmp_path = self.segment_path + '.tmp'
+        index = []
+        written = 0
+        with open(tmp_path, 'wb') as out:
+            out.write(self.MAGIC)
+            for key, records in self._runs():
+                compacted = []
+                for record in sorted(records, key=lambda record: record[0]):
+                    # A record that repeats the previous price and status adds nothing
+                    if compacted and compacted[-1][2:] == record[2:]:
+                        continue
+                    compacted.append(record)
+                last = compacted[-1]
+                if last[3] == self.REMOVED and now - last[0] > self.retention:
+                    continue
+                out.write(b''.join(self.RECORD.pack(*record) for record in compacted))
+                index.append((key, written, len(compacted)))
+                written += len(compacted)
+            index_offset = out.tell()
+            out.write(b''.join(self.INDEX_ENTRY.pack(*entry) for entry in index))
+            out.write(self.FOOTER.pack(index_offset, len(index)))
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp_path, self.segment_path)
+        # A crash before this truncate only leaves duplicates, which the next compaction drops
+        self._wal.truncate(0)
+        self._wal.seek(0)
+        self.wal_records = 0
+        self._load_segment_index()
+        logger.info(f"Compacted price history: {written} records for {len(index)} vehicles")
+
+    def vehicle_history(self, target, vehicle_id):
+        """[(time, price, status)] for one vehicle, oldest first"""
+        key = self._key_ids.get((target, vehicle_id))
+        if key is None:
+            return []
+        records = self._read_wal().get(key, [])
+        if key in self._index:
+            with open(self.segment_path, 'rb') as f:
+                records = self._segment_records(f, key) + records
+        return [(at, price, status) for at, _, price, status in records]
+
+    def find(self, vehicle_id):
+        """Targets that have history for a vehicle id"""
+        return [target for target, known_id in self.keys if known_id == vehicle_id]
+
+    def price_drops(self, since):
+        """Price drops at or after `since`, newest first, streaming one vehicle at a time"""
+        drops = []
+        for key, records in self._runs():
+            previous = None
+            for at, _, price, status in records:
+                if status == self.LISTED and previous and at >= since and 0 < price < previous:
+                    target, vehicle_id = self.keys[key]
+                    drops.append(PriceDrop(target, vehicle_id, previous, price, at))
+                # Same rule as record_scrape: only compare against a price the vehicle was listed at
+                previous = price if status == self.LISTED and price > 0 else None
+        return sorted(drops, key=lambda drop: drop.at, reverse=True)
+
+    def size_bytes(self):
+        return sum(
+            os.path.getsize(path) for path in (self.keys_path, self.wal_path, self.segment_path)
+            if os.path.exists(path)
+        )
+
+    def close(self):
+        self._wal.close()
+        self._keys_file.close()
+
+
+# Telegram message length limit
+TELEGRAM_MAX_MESSAGE_LENGTH = 4096
+
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, bursts of up to `capacity`"""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def delay(self):
+        """Seconds until a token is available, without taking it"""
+        tokens = min(self.capacity, self.tokens + (time.monotonic() - self.updated) * self.rate)
+        return 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+
+
+def split_message(header, entries, footer='', limit=TELEGRAM_MAX_MESSAGE_LENGTH):
+    """Pack entries into as few messages as possible without cutting an entry in half"""
+    messages = []
+    current = header
+    for entry in entries:
+        entry = entry[:limit - len(header) - len(footer)]
+        if len(current) + len(entry) + len(footer) > limit and current != header:
+            messages.append(current + footer)
+            current = header
+        current += entry
+    if current != header or not messages:
+        messages.append(current + footer)
+    return messages
+
+
+class NotificationQueue:
+    """Persistent outbound queue that respects Telegram's global and per-chat rate limits"""
+
+    # Telegram allows ~30 messages/s overall, ~1 message/s per chat and 20 messages/min per group
+    GLOBAL_RATE = 30
+    CHAT_RATE = 1
+    GROUP_RATE = 20 / 60
+    MAX_ATTEMPTS = 5
+
+    def __init__(self, bot, store):
+        self.bot = bot
+        self.store = store
+        self.global_bucket = TokenBucket(self.GLOBAL_RATE, self.GLOBAL_RATE)
+        self.chat_buckets = {}
+        self._wakeup = asyncio.Event()
+        # Set while Telegram asks us to back off; applies to every chat
+        self._paused_until = 0.0
+        # Called with the chat id when a chat blocked the bot or no longer exists
+        self.on_chat_blocked = None
+
+    def _chat_bucket(self, chat_id):
+        # Command replies pass Telegram's int chat id, the outbox and config hold strings
+        chat_id = str(chat_id)
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            # Group and channel ids are negative
+            rate = self.GROUP_RATE if str(chat_id).startswith('-') else self.CHAT_RATE
+            bucket = self.chat_buckets[chat_id] = TokenBucket(rate)
+        return bucket
+
+    async def _wait_for_slot(self, chat_id):
+        delay = self._paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await self._chat_bucket(chat_id).acquire()
+        await self.global_bucket.acquire()
+
+    async def send(self, chat_id, text, reply_to_message_id=None):
+        """Send one message right away (rate limited), retrying once after a flood wait"""
+        for attempt in range(2):
+            started = time.perf_counter()
+            await self._wait_for_slot(chat_id)
+            waited = time.perf_counter()
+            metrics.observe('telegram_rate_limit_wait_seconds', waited - started,
+                            'Time a message waited for a rate limit slot')
+            outcome = 'error'
+            try:
+                await self.bot.send_message(
+                    chat_id=chat_id,
+                    text=text,
+                    parse_mode='HTML',
+                    disable_web_page_preview=False,
+                    reply_to_message_id=reply_to_message_id
+                )
+                outcome = 'ok'
+                return
+            except RetryAfter as e:
+                outcome = 'retry_after'
+                self._paused_until = time.monotonic() + e.retry_after
+                if attempt:
+                    raise
+                logger.warning(f"Telegram flood control, retrying in {e.retry_after} seconds")
+            finally:
+                metrics.observe('telegram_send_seconds', time.perf_counter() - waited,
+                                'Telegram sendMessage latency by outcome', outcome=outcome)
+
+    def enqueue(self, chat_id, texts):
+        """Persist messages and wake the worker"""
+        self.store.enqueue_messages(chat_id, texts)
+        self._wakeup.set()
+
+    def enqueue_many(self, texts_by_chat):
+        """Persist messages for many chats at once and wake the worker"""
+        self.store.enqueue_batch(
+            (chat_id, text) for chat_id, texts in texts_by_chat.items() for text in texts
+        )
+        self._wakeup.set()
+
+    def pending_count(self):
+        return self.store.pending_count()
+
+    async def run(self):
+        """Worker loop delivering queued messages, in order within each chat
+
+        A chat that is out of tokens is skipped until its bucket refills, so one chat's
+        backlog doesn't hold up messages for every other chat.
+        """
+        while True:
+            self._wakeup.clear()
+            waiting = {}
+            for chat_id, bucket in self.chat_buckets.items():
+                delay = bucket.delay()
+                if delay > 0:
+                    waiting[chat_id] = delay
+            pending = self.store.pending_messages(skip_chats=waiting)
+            if not pending:
+                # Sleep until a waiting chat can send again or a new message comes in
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wakeup.wait(), min(waiting.values(), default=None))
+                continue
+
+            held = set()
+            for row in pending:
+                if row['chat_id'] in held:
+                    continue
+                if self._chat_bucket(row['chat_id']).delay() > 0:
+                    # Keep this chat's messages in order; come back once its bucket refills
+                    held.add(row['chat_id'])
+                    continue
+                try:
+                    await self.send(row['chat_id'], row['text'])
+                    self.store.delete_message(row['id'])
+                except RetryAfter:
+                    # Still flooded after waiting once; leave it queued and start over
+                    break
+                except NetworkError as e:
+                    if isinstance(e, BadRequest):
+                        # Malformed message; retrying won't help
+                        logger.error(f"Dropping notification rejected by Telegram: {e}")
+                        self.store.delete_message(row['id'])
+                        continue
+                    # Timeouts and connection problems: keep the message, try again shortly
+                    logger.warning(f"Network error while sending notification: {e}")
+                    self.store.record_attempt(row['id'])
+                    await asyncio.sleep(min(60, 2 ** (row['attempts'] + 1)))
+                    break
+                except Forbidden as e:
+                    # The user blocked the bot or the group is gone; nothing will get through
+                    logger.warning(f"Chat {row['chat_id']} is unreachable, dropping notification: {e}")
+                    self.store.delete_message(row['id'])
+                    if self.on_chat_blocked:
+                        self.on_chat_blocked(row['chat_id'])
+                except TelegramError as e:
+                    if row['attempts'] + 1 >= self.MAX_ATTEMPTS:
+                        logger.error(f"Dropping notification after {self.MAX_ATTEMPTS} attempts: {e}")
+                        self.store.delete_message(row['id'])
+                    else:
+                        logger.error(f"Error sending notification: {e}")
+                        self.store.record_attempt(row['id'])
+
+
+class UpdatePoller:
+    """Long-polling consumer of Telegram updates with a persisted offset"""
+
+    def __init__(self, bot, store, handler, timeout=50, limit=100):
+        self.bot = bot
+        self.store = store
+        self.handler = handler
+        self.timeout = timeout
+        self.limit = limit
+        self.offset = int(store.get_meta('update_offset', 0)) or None
+
+    def _commit_offset(self, update_id):
+        self.offset = update_id + 1
+        self.store.set_meta('update_offset', str(self.offset))
+
+    async def run(self):
+        """Fetch updates in batches and hand each one to the handler without waiting for it"""
+        failures = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                updates = await self.bot.get_updates(
+                    offset=self.offset,
+                    timeout=self.timeout,
+                    limit=self.limit,
+                    allowed_updates=['message']
+                )
+                failures = 0
+                # Long polls that return early carry updates; the rest time out after self.timeout
+                metrics.observe('telegram_poll_seconds', time.perf_counter() - started,
+                                'getUpdates round trip, including the long-poll wait',
+                                result='updates' if updates else 'empty')
+                metrics.inc('telegram_updates_total', len(updates), 'Updates received from Telegram', source='polling')
+            except TimedOut:
+                continue
+            except RetryAfter as e:
+                await asyncio.sleep(e.retry_after)
+                continue
+            except Conflict as e:
+                # Another instance is polling or a webhook is set
+                logger.error(f"Update polling conflict: {e}")
+                await asyncio.sleep(30)
+                continue
+            except TelegramError as e:
+                failures += 1
+                delay = min(60, 2 ** failures)
+                logger.warning(f"Error polling updates, retrying in {delay} seconds: {e}")
+                await asyncio.sleep(delay)
+                continue
+
+            for update in updates:
+                self.handler(update)
+            if updates:
+                self._commit_offset(updates[-1].update_id)
+
+
+class WebhookServer:
+    """Embedded aiohttp server that receives Telegram updates pushed to a webhook"""
+
+    def __init__(self, bot, handler, listen='0.0.0.0', port=8080, path='/telegram', secret=None):
+        self.bot = bot
+        self.handler = handler
+        self.listen = listen
+        self.port = port
+        self.path = path
+        self.secret = secret or secrets.token_urlsafe(32)
+        self.last_update_id = None
+        self._runner = None
+
+    async def _handle(self, request):
+        from aiohttp import web
+
+        if not secrets.compare_digest(request.headers.get('X-Telegram-Bot-Api-Secret-Token', ''), self.secret):
+            return web.Response(status=403)
+        try:
+            data = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+
+        try:
+            update = Update.de_json(data, self.bot)
+            update_id = int(update.update_id)
+        except (TypeError, ValueError, KeyError, AttributeError) as e:
+            # Acknowledge it anyway: Telegram would keep redelivering an update we can never read
+            logger.warning(f"Dropping malformed webhook update: {e!r}")
+            return web.Response()
+        # Telegram redelivers updates it thinks were not acknowledged
+        if self.last_update_id is None or update_id > self.last_update_id:
+            self.last_update_id = update_id
+            metrics.inc('telegram_updates_total', 1, 'Updates received from Telegram', source='webhook')
+            self.handler(update)
+        return web.Response()
+
+    async def start(self, webhook_url):
+        """Start listening and register the webhook with Telegram"""
+        # aiohttp.web is only imported when a server is actually started
+        from aiohttp import web
+
+        app = web.Application()
+        app.router.add_post(self.path, self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.listen, self.port).start()
+        await self.bot.set_webhook(
+            url=webhook_url,
+            secret_token=self.secret,
+            allowed_updates=['message']
+        )
+        logger.info(f"Webhook server listening on {self.listen}:{self.port}{self.path}")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+class MetricsServer:
+    """Small HTTP endpoint serving the metrics in the Prometheus text format"""
+
+    def __init__(self, listen='127.0.0.1', port=9464, path='/metrics'):
+        self.listen = listen
+        self.port = port
+        self.path = path
+        self._runner = None
+
+    async def _handle(self, request):
+        from aiohttp import web
+
+        return web.Response(text=metrics.render(), content_type='text/plain', charset='utf-8')
+
+    async def start(self):
+        from aiohttp import web
+
+        app = web.Application()
+        app.router.add_get(self.path, self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.listen, self.port).start()
+        logger.info(f"Metrics available on http://{self.listen}:{self.port}{self.path}")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+async def watch_event_loop_lag(interval=1.0):
+    """Measure how late the event loop wakes us up; a blocked loop delays every command"""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - started - interval)
+        metrics.observe('event_loop_lag_seconds', lag, 'Event loop wake-up delay')
+
+
+# Command replies are built once; only the few dynamic values are filled in per call
+START_TEMPLATE = (
+    "🤖 <b>Tesla Envanter Bot'a Hoş Geldiniz!</b>\n\n"
+    "🚗 Bu bot Tesla Türkiye envanterini takip eder ve yeni araçlar geldiğinde bildirim gönderir.\n\n"
+    "<b>📋 Kullanılabilir Komutlar:</b>\n"
+    "/help - Bu yardım mesajını gösterir\n"
+    "/ping - Bot'un çalışıp çalışmadığını kontrol eder\n"
+    "/manuel-arama - Envanterde manuel arama yapar (yenile: güncel sonucu zorla)\n"
+    "/durum - Bot durumunu ve ayarlarını gösterir\n"
+    "/durdur - Otomatik takibi durdurur\n"
+    "/basla - Otomatik takibi başlatır\n"
+    "/modeller - Takip edilen modelleri gösterir\n"
+    "/son-degisiklikler - Son eklenen ve kaldırılan araçları gösterir\n"
+    "/abone - Filtrelerinize uyan yeni araçlar için bildirim alın\n"
+    "/aboneliklerim - Aboneliklerinizi gösterir\n"
+    "/abonelik-iptal - Aboneliklerinizi siler\n"
+    "/fiyat-dususleri - Fiyatı düşen araçları gösterir\n"
+    "/arac - Bir aracın fiyat ve listede kalma geçmişini gösterir\n\n"
+    "📊 <b>Takip Edilen Modeller:</b> {models}\n"
+    "⏰ <b>Kontrol Aralığı:</b> {interval} saniye\n"
+    "🔄 <b>Otomatik Takip:</b> {monitoring}"
+)
+
+HELP_MESSAGE = (
+    "🆘 <b>Tesla Envanter Bot Yardım</b>\n\n"
+    "<b>📋 Komutlar:</b>\n\n"
+    "🏁 <b>/start</b> - Bot'u başlatır ve ana menüyü gösterir\n"
+    "📋 <b>/help</b> - Bu yardım mesajını gösterir\n"
+    "🏓 <b>/ping</b> - Bot'un çalışıp çalışmadığını test eder\n"
+    "🔍 <b>/manuel-arama [yenile]</b> - Tesla envanterinde manuel arama yapar; son birkaç dakikanın sonucu tekrar kullanılır, <i>yenile</i> siteyi hemen yeniden kontrol eder\n"
+    "📊 <b>/durum</b> - Bot durumu ve ayarlarını gösterir\n"
+    "⏹️ <b>/durdur</b> - Otomatik envanter takibini durdurur\n"
+    "▶️ <b>/basla</b> - Otomatik envanter takibini başlatır\n"
+    "🚗 <b>/modeller</b> - Takip edilen araç modellerini gösterir\n"
+    "🕑 <b>/son-degisiklikler [saat]</b> - Son eklenen ve kaldırılan araçları gösterir (varsayılan 24 saat)\n"
+    "🔔 <b>/abone [filtreler]</b> - Model, donanım, fiyat, renk ve şehre göre bildirim aboneliği ekler\n"
+    "📋 <b>/aboneliklerim</b> - Bu sohbetin aboneliklerini gösterir\n"
+    "🗑️ <b>/abonelik-iptal [numara|hepsi]</b> - Abonelik siler\n"
+    "💸 <b>/fiyat-dususleri [saat]</b> - Fiyatı düşen araçları gösterir (varsayılan 24 saat)\n"
+    "🔎 <b>/arac [VIN]</b> - Aracın ne zamandır listede olduğunu ve fiyat geçmişini gösterir\n\n"
+    "<b>ℹ️ Nasıl Çalışır?</b>\n"
+    "• Bot düzenli aralıklarla Tesla Türkiye sitesini kontrol eder\n"
+    "• Yeni araç geldiğinde otomatik bildirim gönderir\n"
+    "• Manuel olarak da arama yapabilirsiniz\n"
+    "• Tireli komutlar alt çizgiyle de yazılabilir (ör. /manuel_arama)\n\n"
+    "<b>⚠️ Not:</b> Bot yalnızca belirtilen modelleri takip eder."
+)
+
+PING_TEMPLATE = (
+    "🏓 <b>Pong!</b>\n\n"
+    "✅ Bot çalışıyor ve komutlara yanıt veriyor.\n"
+    "⏰ Son kontrol: {time}\n"
+    "🔄 Otomatik takip: {monitoring}"
+)
+
+ADMIN_ONLY_MESSAGE = (
+    "🔒 <b>Bu komut yalnızca bot yöneticisinin sohbetinde kullanılabilir.</b>\n\n"
+    "🔔 Bildirim almak için <b>/abone</b> komutunu kullanabilirsiniz."
+)
+
+SUBSCRIBE_USAGE = (
+    "🔔 <b>Abonelik</b>\n\n"
+    "Filtrelerinize uyan yeni araçlar geldiğinde bu sohbete bildirim gönderilir.\n\n"
+    "<b>Kullanım:</b>\n"
+    "<code>/abone model=Model Y renk=beyaz sehir=istanbul fiyat=2500000</code>\n\n"
+    "<b>Filtreler</b> (hepsi isteğe bağlı):\n"
+    "• <b>model</b> - Model 3, Model Y, ...\n"
+    "• <b>donanim</b> - ör. Long Range, Performance\n"
+    "• <b>fiyat</b> - en yüksek fiyat (TL)\n"
+    "• <b>renk</b> - ör. beyaz, siyah, mavi\n"
+    "• <b>sehir</b> - ör. İstanbul\n\n"
+    "⚠️ Renk, şehir ve fiyat yalnızca envanter verisinde bu bilgiler varsa eşleşir."
+)
+
+
+STATUS_TEMPLATE = (
+    "📊 <b>Bot Durumu</b>\n\n"
+    "🔄 <b>Otomatik Takip:</b> {monitoring}\n"
+    "🚗 <b>Takip Edilen Modeller:</b> {models}\n"
+    "⏰ <b>Kontrol Aralığı:</b> {interval} saniye\n"
+    "📁 <b>Kayıtlı Araç Sayısı:</b> {vehicles}\n"
+    "📬 <b>Bekleyen Bildirim:</b> {pending}\n"
+    "🔔 <b>Abonelik:</b> {subscriptions} ({subscription_chats} sohbet)\n"
+    "💾 <b>Önbellek:</b> {not_modified} değişmedi (304), {same_body} aynı sayfa, "
+    "{same_payload} aynı veri, {miss} yeni veri\n"
+)
+
+STOPPED_MESSAGE = (
+    "⏹️ <b>Otomatik takip durduruldu</b>\n\n"
+    "🔴 Artık otomatik envanter kontrolü yapılmayacak.\n"
+    "▶️ Tekrar başlatmak için <b>/basla</b> komutunu kullanın.\n"
+    "🔍 Manuel arama için <b>/manuel-arama</b> komutunu kullanabilirsiniz."
+)
+
+STARTED_TEMPLATE = (
+    "▶️ <b>Otomatik takip başlatıldı</b>\n\n"
+    "🟢 Otomatik envanter kontrolü aktif.\n"
+    "⏰ Her {interval} saniyede bir kontrol edilecek.\n"
+    "⏹️ Durdurmak için <b>/durdur</b> komutunu kullanın."
+)
+
+MANUAL_SEARCH_STARTED_MESSAGE = (
+    "🔍 <b>Manuel arama başlatılıyor...</b>\n\n"
+    "Tesla envanteri kontrol ediliyor, lütfen bekleyin..."
+)
+
+MANUAL_SEARCH_PAUSED_MESSAGE = (
+    "\n\n⏸️ Tesla istekleri yavaşlattığı için site şu anda yeniden kontrol edilmiyor; "
+    "son bilinen sonuç gösteriliyor."
+)
+
+MANUAL_SEARCH_ERROR_TEMPLATE = (
+    "❌ <b>Manuel arama hatası</b>\n\n"
+    "Envanter kontrolü sırasında bir hata oluştu.\n"
+    "🔗 <a href='{url}'>Tesla Sitesini Kontrol Et</a>"
+)
+
+UNKNOWN_COMMAND_MESSAGE = (
+    "❓ <b>Bilinmeyen komut</b>\n\n"
+    "📋 <b>/help</b> komutu ile kullanılabilir komutları görebilirsiniz."
+)
+
+COMMAND_TIMEOUT_MESSAGE = (
+    "⌛ <b>Komut zaman aşımına uğradı</b>\n\n"
+    "Lütfen biraz sonra tekrar deneyin."
+)
+
+VEHICLE_USAGE = "📋 <b>Kullanım:</b> <code>/arac VIN</code>"
+
+UNSUBSCRIBE_USAGE = (
+    "📋 <b>Kullanım:</b> <code>/abonelik-iptal numara</code> veya <code>/abonelik-iptal hepsi</code>"
+)
+
+
+def parse_hours(args):
+    """Optional [saat] argument; anything unreadable means the last 24 hours"""
+    try:
+        return {'hours': max(1, int(args[0])) if args else 24}
+    except ValueError:
+        return {'hours': 24}
+
+
+def parse_vehicle_id(args):
+    if not args:
+        raise ValueError("missing VIN")
+    vehicle_id = args[0].strip()
+    # VINs are stored upper-case, make_vehicle_id's digest ids (model-y-<hex>) lower-case
+    if len(vehicle_id) == 17 and '-' not in vehicle_id:
+        return {'vehicle_id': vehicle_id.upper()}
+    return {'vehicle_id': vehicle_id.lower()}
+
+
+def parse_refresh(args):
+    return {'force': bool(args) and args[0].lower() == 'yenile'}
+
+
+def parse_filters(args):
+    if not args:
+        raise ValueError("missing filters")
+    return {'text': ' '.join(args)}
+
+
+def parse_subscription_id(args):
+    """'hepsi' (every subscription, None) or a subscription number"""
+    if args and args[0].lower() == 'hepsi':
+        return {'subscription_id': None}
+    if args and args[0].lstrip('#').isdigit():
+        return {'subscription_id': int(args[0].lstrip('#'))}
+    raise ValueError("expected a subscription number or 'hepsi'")
+
+
+@dataclass(slots=True)
+class Command:
+    """A bot command and how it may be called
+
+    The handler is the bot's `command_<name>` method; it receives a CommandContext plus
+    whatever `parse` makes of the arguments, and returns the reply. A ValueError from
+    `parse` answers with `usage` instead.
+    """
+    name: str
+    aliases: tuple = ()
+    parse: Optional[Callable] = None
+    usage: str = ''
+    # Changes the bot for everyone; only accepted from TELEGRAM_CHAT_ID
+    admin: bool = False
+    # Invocations of this command running at once (0: no limit); later ones wait their turn
+    concurrency: int = 0
+    # Seconds before the handler is cancelled and the user told to try again
+    timeout: Optional[float] = None
+
+    @property
+    def handler_name(self):
+        return 'command_' + self.name.lstrip('/').replace('-', '_')
+
+
+@dataclass(slots=True)
+class CommandContext:
+    """Where a command came from; chat_id is None for the configured chat"""
+    chat_id: Optional[str]
+    message_id: Optional[int]
+
+
+# Telegram only links /commands made of letters, digits and underscores, so every
+# hyphenated command also answers to its underscore spelling
+COMMANDS = [
+    Command('/start'),
+    Command('/help', aliases=('/yardim', '/yardım')),
+    Command('/ping'),
+    Command('/durum', aliases=('/status',)),
+    Command('/modeller'),
+    Command('/durdur', admin=True),
+    Command('/basla', aliases=('/başla',), admin=True),
+    Command('/son-degisiklikler', aliases=('/son_degisiklikler', '/son-değişiklikler'), parse=parse_hours, concurrency=2),
+    Command('/fiyat-dususleri', aliases=('/fiyat_dususleri', '/fiyat-düşüşleri'), parse=parse_hours, concurrency=2),
+    Command('/arac', aliases=('/araç',), parse=parse_vehicle_id, usage=VEHICLE_USAGE, concurrency=2),
+    Command('/manuel-arama', aliases=('/manuel_arama', '/ara'), parse=parse_refresh, concurrency=2, timeout=150),
+    Command('/abone', parse=parse_filters, usage=SUBSCRIBE_USAGE),
+    Command('/aboneliklerim'),
+    Command('/abonelik-iptal', aliases=('/abonelik_iptal',), parse=parse_subscription_id, usage=UNSUBSCRIBE_USAGE)
+]
+
+
+class CommandRegistry:
+    """Looks commands up by name or alias and holds their concurrency limits"""
+
+    def __init__(self, commands):
+        self.commands = {}
+        self._limits = {}
+        for command in commands:
+            for name in (command.name,) + command.aliases:
+                if name in self.commands:
+                    raise ValueError(f"Command name {name} is used twice")
+                self.commands[name] = command
+            if command.concurrency:
+                self._limits[command.name] = asyncio.Semaphore(command.concurrency)
+
+    def get(self, name):
+        return self.commands.get(name)
+
+    def limit(self, command):
+        """Async context manager holding one of the command's concurrency slots"""
+        return self._limits.get(command.name) or contextlib.nullcontext()
+
 
 class TeslaInventoryBot:
     def __init__(self):
@@ -28,347 +2367,853 @@ class TeslaInventoryBot:
         self.check_interval = int(os.getenv('CHECK_INTERVAL', 300))
         self.models = json.loads(os.getenv('MODELS', '["Model 3", "Model Y"]'))
         self.tesla_url = os.getenv('TESLA_URL', 'https://www.tesla.com/tr_tr/inventory/new')
+        self.targets = load_targets(
+            self.tesla_url, self.models, self.check_interval,
+            jitter=float(os.getenv('SCHEDULER_JITTER', 0.1)),
+            failure_threshold=int(os.getenv('CIRCUIT_BREAKER_THRESHOLD', 5)),
+            cooldown=int(os.getenv('CIRCUIT_BREAKER_COOLDOWN', 1800))
+        )
         self.data_dir = os.getenv('DATA_DIR', '/app/data')
+        # Smaller pools, thread parsing and no metrics endpoint for 512 MB Pis; every value can still be overridden
+        self.low_memory = os.getenv('LOW_MEMORY', 'false').lower() == 'true'
+        self.update_mode = os.getenv('UPDATE_MODE', 'polling').lower()
+        self.webhook_url = os.getenv('WEBHOOK_URL', '')
+        # Point at a local fake server for testing
+        telegram_api_url = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org').rstrip('/')
         
-        self.bot = Bot(token=self.telegram_token)
-        self.last_vehicles = set()
-        self.data_file = os.path.join(self.data_dir, 'last_inventory.json')
+        # Replies, notifications and long polling run concurrently, so give sends a real pool
+        self.bot = Bot(
+            token=self.telegram_token,
+            base_url=f"{telegram_api_url}/bot",
+            base_file_url=f"{telegram_api_url}/file/bot",
+            request=HTTPXRequest(connection_pool_size=2 if self.low_memory else 8)
+        )
+        self.fetcher = InventoryFetcher(
+            connect_timeout=float(os.getenv('HTTP_CONNECT_TIMEOUT', 10)),
+            read_timeout=float(os.getenv('HTTP_READ_TIMEOUT', 30)),
+            limit_per_host=int(os.getenv('HTTP_MAX_CONNECTIONS_PER_HOST', 1 if self.low_memory else 2)),
+            # Keep idle connections a little longer than one check cycle so TLS is reused
+            keepalive_timeout=min(target.interval for target in self.targets) + 30,
+            max_concurrent=int(os.getenv('HTTP_MAX_CONCURRENT_FETCHES', 1 if self.low_memory else 4))
+        )
+        # Capture every raw response for offline replay (see benchmarks/replay.py)
+        record_dir = os.getenv('RECORD_DIR')
+        if record_dir:
+            self.fetcher = RecordingFetcher(self.fetcher, FetchRecording(record_dir))
+            logger.info(f"Recording inventory responses to {record_dir}")
+        self.http_cache = HttpCache()
+        # /manuel-arama answers from results younger than this instead of fetching again
+        self.snapshot_ttl = int(os.getenv('SNAPSHOT_TTL', 120))
+        # Parse pages off the event loop; created before the store so workers fork from a lean process
+        self.parse_pool = ParsePool(
+            mode=os.getenv('PARSE_EXECUTOR', 'thread' if self.low_memory else 'process').lower(),
+            workers=int(os.getenv('PARSE_WORKERS', 0)) or None,
+            timeout=float(os.getenv('PARSE_TIMEOUT', 60))
+        )
+        metrics.gauge_callback('parse_workers_resident_memory_bytes', self.parse_pool.worker_rss_bytes,
+                               'Resident memory of the parse worker processes')
         self.is_monitoring = True
         
         # Create data directory
         os.makedirs(self.data_dir, exist_ok=True)
         
-        # Load last known inventory
-        self.load_last_inventory()
+        # Open the inventory store, retiring the old JSON cache once if present
+        self.store = InventoryStore(os.path.join(self.data_dir, 'inventory.db'))
+        if self.store.retire_legacy_json(os.path.join(self.data_dir, 'last_inventory.json')):
+            self.store.set_meta(f'needs_baseline:{self.targets[0].name}', '1')
+        logger.info(f"Loaded {self.store.active_count()} vehicles from inventory store")
+        
+        # Price/availability history kept next to the store in its own append-only files
+        self.history = PriceHistory(
+            os.path.join(self.data_dir, 'history'),
+            retention_days=int(os.getenv('HISTORY_RETENTION_DAYS', 365))
+        )
+        metrics.gauge_callback('price_history_bytes', self.history.size_bytes, 'Size of the price history files')
+        
+        self.notifier = NotificationQueue(self.bot, self.store)
+        self.notifier.on_chat_blocked = self.unsubscribe_chat
         
-        logger.info(f"Bot initialized. Monitoring models: {self.models}")
+        # Scrape diff events -> handlers; NOTIFY_EVENTS picks what the configured chat hears about
+        notify_events = [kind.strip() for kind in os.getenv('NOTIFY_EVENTS', 'added').lower().split(',') if kind.strip()]
+        unknown = set(notify_events) - set(DIFF_EVENTS)
+        if unknown:
+            raise ValueError(f"NOTIFY_EVENTS must only contain {', '.join(DIFF_EVENTS)}, not {', '.join(sorted(unknown))}")
+        self.diff_handlers = {kind: [] for kind in DIFF_EVENTS}
+        formatters = {
+            'added': self.format_vehicle_digest,
+            'returned': self.format_returned_vehicles,
+            'removed': self.format_removed_vehicles,
+            'changed': self.format_vehicle_changes
+        }
+        for kind in notify_events:
+            self.on_diff(kind, self.notify_chat(formatters[kind]))
+        # Subscribers are told about new vehicles matching their filters; the configured
+        # chat's own subscriptions only matter when it doesn't hear about every new vehicle
+        include_configured_chat = 'added' not in notify_events
+        self.on_diff('added', lambda vehicles, target: self.notify_subscribers(
+            vehicles, target, include_configured_chat=include_configured_chat
+        ))
+        self.subscriptions = SubscriptionIndex(self.store.subscriptions())
+        if self.subscriptions:
+            logger.info(f"Loaded {len(self.subscriptions)} subscriptions for {self.subscriptions.chat_count()} chats")
+        pending = self.notifier.pending_count()
+        if pending:
+            logger.info(f"{pending} queued notifications will be delivered")
+        
+        self.poller = UpdatePoller(
+            self.bot,
+            self.store,
+            self.handle_update,
+            timeout=int(os.getenv('UPDATE_POLL_TIMEOUT', 50))
+        )
+        self.webhook = WebhookServer(
+            self.bot,
+            self.handle_update,
+            listen=os.getenv('WEBHOOK_LISTEN', '0.0.0.0'),
+            port=int(os.getenv('WEBHOOK_PORT', 8080)),
+            path=os.getenv('WEBHOOK_PATH', '/telegram'),
+            secret=os.getenv('WEBHOOK_SECRET') or None
+        )
+        self.commands = CommandRegistry(COMMANDS)
+        self._command_tasks = set()
+        # Commands arriving while this many are still running are dropped (flood protection)
+        self.max_command_tasks = int(os.getenv('MAX_CONCURRENT_COMMANDS', 50))
+        
+        # METRICS_PORT=0 turns the endpoint off; the numbers still show up in /durum
+        metrics_port = int(os.getenv('METRICS_PORT', 0 if self.low_memory else 9464))
+        self.metrics_server = MetricsServer(
+            listen=os.getenv('METRICS_LISTEN', '127.0.0.1'),
+            port=metrics_port
+        ) if metrics_port else None
+        metrics.gauge_callback('telegram_queue_depth', self.notifier.pending_count, 'Notifications waiting to be sent')
+        
+        for target in self.targets:
+            logger.info(f"Bot initialized. Target {target.name}: {target.url} models={target.models} every {target.interval}s")
     
-    def load_last_inventory(self):
-        """Load last known inventory from file"""
-        try:
-            if os.path.exists(self.data_file):
-                with open(self.data_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.last_vehicles = set(data.get('vehicles', []))
-                logger.info(f"Loaded {len(self.last_vehicles)} vehicles from cache")
-        except Exception as e:
-            logger.error(f"Error loading last inventory: {e}")
-            self.last_vehicles = set()
+    async def fetch_inventory(self, target):
+        """Fetch and extract one target, raising FetchError when the page can't be fetched
+
+        Returns (vehicles, changed). When the page is unchanged - a 304, an identical body or
+        identical extracted records - the previous records are returned with changed=False.
+        Callers asking for a target while a fetch for it is running share that fetch, so
+        manual searches and scheduled checks never hit Tesla twice for the same page.
+        """
+        task = target.inflight
+        if task is None or task.done():
+            task = target.inflight = asyncio.ensure_future(self._fetch_inventory(target))
+            task.add_done_callback(lambda done: self._fetch_done(target, done))
+        else:
+            metrics.inc('tesla_fetch_coalesced_total', 1, 'Fetches answered by an already running fetch',
+                        target=target.name)
+            logger.info(f"[{target.name}] Joining the fetch already in progress")
+        # One caller giving up (e.g. a cancelled command) must not cancel the others' fetch
+        return await asyncio.shield(task)
     
-    def save_last_inventory(self):
-        """Save current inventory to file"""
+    def _fetch_done(self, target, task):
+        if target.inflight is task:
+            target.inflight = None
+        if not task.cancelled():
+            # Every awaiting caller may have been cancelled; don't warn about an unread error
+            error = task.exception()
+            if isinstance(error, (FetchError, ParseTimeout)):
+                # Once per fetch, whether a scheduled check or a manual search started it
+                target.scheduler.record_failure(error)
+    
+    async def _fetch_inventory(self, target):
+        url = target.url
+        cache = self.http_cache
+        
+        logger.info(f"[{target.name}] Fetching Tesla inventory from: {url}")
         try:
-            data = {
-                'vehicles': list(self.last_vehicles),
-                'last_update': datetime.now().isoformat()
-            }
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            logger.error(f"Error saving inventory: {e}")
+            content = await self.fetcher.fetch(url, cache=cache, cache_key=target.name)
+        except FetchError as e:
+            if e.status != 403:
+                raise
+            logger.warning(f"[{target.name}] 403 Forbidden - Tesla may be blocking requests. Retrying with minimal headers...")
+            content = await self.fetcher.fetch(url, headers=SIMPLE_HEADERS, cache=cache, cache_key=target.name)
+        
+        if content is None:
+            cache.count('not_modified')
+            logger.info(f"[{target.name}] Page not modified since last check")
+            target.fetched_at = time.time()
+            return target.vehicles, False
+        
+        logger.info(f"[{target.name}] Successfully fetched page, content length: {len(content)}")
+        if cache.body_unchanged(target.name, content):
+            cache.count('same_body')
+            logger.info(f"[{target.name}] Page content unchanged, skipping parse")
+            target.fetched_at = time.time()
+            return target.vehicles, False
+        
+        try:
+            extractor_name, vehicles = await target.extractors.extract_async(self.parse_pool, content, url, target.models)
+        except Exception:
+            # The digest and validators above describe a page we never parsed; forget them so
+            # the next fetch (scheduled or manual) parses it instead of calling it unchanged
+            cache.entries.pop(target.name, None)
+            raise
+        logger.info(f"[{target.name}] Found {len(vehicles)} vehicles in inventory (extractor: {extractor_name or '-'})")
+        target.vehicles = vehicles
+        target.fetched_at = time.time()
+        
+        if cache.payload_unchanged(target.name, vehicles):
+            cache.count('same_payload')
+            return vehicles, False
+        cache.count('miss')
+        # Whoever fetched, the next check_inventory still has to diff and notify these records
+        target.pending_diff = True
+        return vehicles, True
     
-    def get_tesla_inventory(self):
+    async def get_tesla_inventory(self, target=None):
         """Scrape Tesla Turkey inventory"""
+        target = target or self.targets[0]
         try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                'Accept-Language': 'tr-TR,tr;q=0.9,en;q=0.8',
-                'Accept-Encoding': 'gzip, deflate, br',
-                'DNT': '1',
-                'Connection': 'keep-alive',
-                'Upgrade-Insecure-Requests': '1',
-                'Sec-Fetch-Dest': 'document',
-                'Sec-Fetch-Mode': 'navigate',
-                'Sec-Fetch-Site': 'none',
-                'Cache-Control': 'max-age=0'
-            }
-            
-            # Tesla Turkey inventory URL
-            url = self.tesla_url
-            
-            logger.info(f"Fetching Tesla inventory from: {url}")
-            response = requests.get(url, headers=headers, timeout=30, allow_redirects=True)
-            
-            if response.status_code == 403:
-                logger.warning("403 Forbidden - Tesla may be blocking requests. Trying alternative approach...")
-                # Try with different approach or simulate browser
-                import time
-                time.sleep(2)  # Small delay
-                
-                # Try again with minimal headers
-                simple_headers = {
-                    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
-                }
-                response = requests.get(url, headers=simple_headers, timeout=30)
-            
-            response.raise_for_status()
-            logger.info(f"Successfully fetched page, content length: {len(response.content)}")
-            
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            vehicles = []
-            
-            # Look for vehicle cards (Tesla's structure may change)
-            # Try multiple selectors
-            possible_selectors = [
-                'div[data-testid*="vehicle"]',
-                'article[data-testid*="vehicle"]',
-                '.vehicle-card',
-                '.inventory-card',
-                '[class*="vehicle"]',
-                '[class*="inventory"]'
-            ]
-            
-            vehicle_cards = []
-            for selector in possible_selectors:
-                cards = soup.select(selector)
-                if cards:
-                    vehicle_cards.extend(cards)
-                    logger.debug(f"Found {len(cards)} cards with selector: {selector}")
-            
-            # If no specific selectors work, try broader approach
-            if not vehicle_cards:
-                vehicle_cards = soup.find_all(['div', 'article'], class_=lambda x: x and any(
-                    keyword in str(x).lower() for keyword in ['vehicle', 'car', 'inventory', 'product']
-                ))
-            
-            logger.info(f"Found {len(vehicle_cards)} potential vehicle cards")
-            
-            for card in vehicle_cards:
-                try:
-                    # Extract vehicle information
-                    text_content = card.get_text(strip=True)
-                    
-                    # Check if any of our monitored models are mentioned
-                    model_found = None
-                    for model in self.models:
-                        if model.lower() in text_content.lower():
-                            model_found = model
-                            break
-                    
-                    if model_found:
-                        # Create unique identifier for the vehicle
-                        vehicle_id = f"{model_found}_{hash(text_content) % 10000}"
-                        
-                        vehicle_info = {
-                            'id': vehicle_id,
-                            'model': model_found,
-                            'details': text_content[:200],  # First 200 chars
-                            'url': url
-                        }
-                        
-                        vehicles.append(vehicle_info)
-                        logger.debug(f"Found vehicle: {model_found}")
-                        
-                except Exception as e:
-                    logger.debug(f"Error parsing vehicle card: {e}")
-                    continue
-            
-            logger.info(f"Found {len(vehicles)} vehicles in inventory")
-            
-            # If no vehicles found, log page content for debugging (first 500 chars)
-            if not vehicles:
-                logger.debug(f"No vehicles found. Page content preview: {soup.get_text()[:500]}")
-            
+            vehicles, _ = await self.fetch_inventory(target)
             return vehicles
-            
-        except requests.RequestException as e:
-            logger.error(f"Error fetching Tesla inventory: {e}")
+        except FetchError as e:
+            logger.error(f"[{target.name}] Error fetching Tesla inventory: {e}")
             return []
         except Exception as e:
-            logger.error(f"Unexpected error: {e}")
+            logger.error(f"[{target.name}] Unexpected error: {e}")
             return []
     
-    async def send_telegram_message(self, message, reply_to_message_id=None):
-        """Send message to Telegram"""
+    async def send_telegram_message(self, message, reply_to_message_id=None, chat_id=None):
+        """Send message to Telegram (the configured chat unless another one is given)"""
         try:
-            await self.bot.send_message(
-                chat_id=self.chat_id,
-                text=message,
-                parse_mode='HTML',
-                disable_web_page_preview=False,
-                reply_to_message_id=reply_to_message_id
-            )
+            await self.notifier.send(chat_id or self.chat_id, message, reply_to_message_id=reply_to_message_id)
             logger.info("Telegram message sent successfully")
         except TelegramError as e:
             logger.error(f"Error sending Telegram message: {e}")
     
-    async def process_command(self, command, message_id=None):
-        """Process bot commands"""
+    def unsubscribe_chat(self, chat_id):
+        """Drop every subscription of a chat"""
+        for subscription_id in self.store.remove_subscriptions(chat_id):
+            self.subscriptions.remove(subscription_id)
+    
+    def is_admin_chat(self, chat_id):
+        return chat_id is None or str(chat_id) == str(self.chat_id)
+    
+    async def process_command(self, command, message_id=None, args=None, chat_id=None):
+        """Run a command from the registry within its limits and send the reply"""
+        started = time.perf_counter()
+        spec = self.commands.get(command)
+        outcome = 'ok'
         try:
-            if command == '/start':
-                message = "🤖 <b>Tesla Envanter Bot'a Hoş Geldiniz!</b>\n\n"
-                message += "🚗 Bu bot Tesla Türkiye envanterini takip eder ve yeni araçlar geldiğinde bildirim gönderir.\n\n"
-                message += "<b>📋 Kullanılabilir Komutlar:</b>\n"
-                message += "/help - Bu yardım mesajını gösterir\n"
-                message += "/ping - Bot'un çalışıp çalışmadığını kontrol eder\n"
-                message += "/manuel-arama - Envanterde manuel arama yapar\n"
-                message += "/durum - Bot durumunu ve ayarlarını gösterir\n"
-                message += "/durdur - Otomatik takibi durdurur\n"
-                message += "/basla - Otomatik takibi başlatır\n"
-                message += "/modeller - Takip edilen modelleri gösterir\n\n"
-                message += f"📊 <b>Takip Edilen Modeller:</b> {', '.join(self.models)}\n"
-                message += f"⏰ <b>Kontrol Aralığı:</b> {self.check_interval} saniye\n"
-                message += f"🔄 <b>Otomatik Takip:</b> {'Aktif' if self.is_monitoring else 'Pasif'}"
-                
-            elif command == '/help':
-                message = "🆘 <b>Tesla Envanter Bot Yardım</b>\n\n"
-                message += "<b>📋 Komutlar:</b>\n\n"
-                message += "🏁 <b>/start</b> - Bot'u başlatır ve ana menüyü gösterir\n"
-                message += "📋 <b>/help</b> - Bu yardım mesajını gösterir\n"
-                message += "🏓 <b>/ping</b> - Bot'un çalışıp çalışmadığını test eder\n"
-                message += "🔍 <b>/manuel-arama</b> - Tesla envanterinde manuel arama yapar\n"
-                message += "📊 <b>/durum</b> - Bot durumu ve ayarlarını gösterir\n"
-                message += "⏹️ <b>/durdur</b> - Otomatik envanter takibini durdurur\n"
-                message += "▶️ <b>/basla</b> - Otomatik envanter takibini başlatır\n"
-                message += "🚗 <b>/modeller</b> - Takip edilen araç modellerini gösterir\n\n"
-                message += "<b>ℹ️ Nasıl Çalışır?</b>\n"
-                message += "• Bot düzenli aralıklarla Tesla Türkiye sitesini kontrol eder\n"
-                message += "• Yeni araç geldiğinde otomatik bildirim gönderir\n"
-                message += "• Manuel olarak da arama yapabilirsiniz\n\n"
-                message += "<b>⚠️ Not:</b> Bot yalnızca belirtilen modelleri takip eder."
-                
-            elif command == '/ping':
-                message = "🏓 <b>Pong!</b>\n\n"
-                message += "✅ Bot çalışıyor ve komutlara yanıt veriyor.\n"
-                message += f"⏰ Son kontrol: {datetime.now().strftime('%H:%M:%S')}\n"
-                message += f"🔄 Otomatik takip: {'Aktif' if self.is_monitoring else 'Pasif'}"
-                
-            elif command == '/durum':
-                message = "📊 <b>Bot Durumu</b>\n\n"
-                message += f"🔄 <b>Otomatik Takip:</b> {'🟢 Aktif' if self.is_monitoring else '🔴 Pasif'}\n"
-                message += f"🚗 <b>Takip Edilen Modeller:</b> {', '.join(self.models)}\n"
-                message += f"⏰ <b>Kontrol Aralığı:</b> {self.check_interval} saniye\n"
-                message += f"📁 <b>Kayıtlı Araç Sayısı:</b> {len(self.last_vehicles)}\n"
-                message += f"🌐 <b>Tesla URL:</b> {self.tesla_url}\n"
-                message += f"🕐 <b>Son Güncelleme:</b> {datetime.now().strftime('%d.%m.%Y %H:%M:%S')}"
-                
-            elif command == '/modeller':
-                message = "🚗 <b>Takip Edilen Tesla Modelleri</b>\n\n"
-                for i, model in enumerate(self.models, 1):
-                    message += f"{i}. {model}\n"
-                
-                message += f"\n📊 <b>Toplam:</b> {len(self.models)} model\n"
-                message += "\n💡 <b>Not:</b> Model listesini değiştirmek için bot ayarlarını güncelleyin."
-                
-            elif command == '/durdur':
-                self.is_monitoring = False
-                message = "⏹️ <b>Otomatik takip durduruldu</b>\n\n"
-                message += "🔴 Artık otomatik envanter kontrolü yapılmayacak.\n"
-                message += "▶️ Tekrar başlatmak için <b>/basla</b> komutunu kullanın.\n"
-                message += "🔍 Manuel arama için <b>/manuel-arama</b> komutunu kullanabilirsiniz."
-                logger.info("Monitoring stopped by user command")
-                
-            elif command == '/basla':
-                self.is_monitoring = True
-                message = "▶️ <b>Otomatik takip başlatıldı</b>\n\n"
-                message += "🟢 Otomatik envanter kontrolü aktif.\n"
-                message += f"⏰ Her {self.check_interval} saniyede bir kontrol edilecek.\n"
-                message += "⏹️ Durdurmak için <b>/durdur</b> komutunu kullanın."
-                logger.info("Monitoring started by user command")
-                
-            elif command == '/manuel-arama':
-                await self.send_telegram_message(
-                    "🔍 <b>Manuel arama başlatılıyor...</b>\n\nTesla envanteri kontrol ediliyor, lütfen bekleyin...",
-                    reply_to_message_id=message_id
-                )
-                
-                try:
-                    vehicles = self.get_tesla_inventory()
-                    
-                    if vehicles:
-                        message = f"🎉 <b>Envanterde {len(vehicles)} araç bulundu!</b>\n\n"
-                        for vehicle in vehicles[:5]:  # İlk 5 aracı göster
-                            message += f"🚗 <b>{vehicle['model']}</b>\n"
-                            message += f"📝 {vehicle['details'][:100]}...\n\n"
-                        
-                        if len(vehicles) > 5:
-                            message += f"... ve {len(vehicles) - 5} araç daha\n\n"
-                        
-                        message += f"🔗 <a href='{self.tesla_url}'>Tüm Envanteri Görüntüle</a>"
-                    else:
-                        message = "😔 <b>Envanterde araç bulunamadı</b>\n\n"
-                        message += "Takip edilen modellerde şu anda uygun araç yok.\n"
-                        message += f"🚗 Aranan modeller: {', '.join(self.models)}\n\n"
-                        message += f"🔗 <a href='{self.tesla_url}'>Tesla Sitesini Kontrol Et</a>"
-                    
-                except Exception as e:
-                    message = "❌ <b>Manuel arama hatası</b>\n\n"
-                    message += "Envanter kontrolü sırasında bir hata oluştu.\n"
-                    message += f"🔗 <a href='{self.tesla_url}'>Tesla Sitesini Kontrol Et</a>"
-                    logger.error(f"Manual search error: {e}")
+            if spec is None:
+                outcome = 'unknown'
+                message = UNKNOWN_COMMAND_MESSAGE
+            elif spec.admin and not self.is_admin_chat(chat_id):
+                outcome = 'denied'
+                message = ADMIN_ONLY_MESSAGE
             else:
-                message = "❓ <b>Bilinmeyen komut</b>\n\n"
-                message += "📋 <b>/help</b> komutu ile kullanılabilir komutları görebilirsiniz."
+                try:
+                    params = spec.parse(args or []) if spec.parse else {}
+                except ValueError:
+                    outcome = 'usage'
+                    message = spec.usage
+                else:
+                    handler = getattr(self, spec.handler_name)
+                    async with self.commands.limit(spec):
+                        message = await asyncio.wait_for(
+                            handler(CommandContext(chat_id, message_id), **params), spec.timeout
+                        )
             
-            await self.send_telegram_message(message, reply_to_message_id=message_id)
+            await self.send_telegram_message(message, reply_to_message_id=message_id, chat_id=chat_id)
             
+        except asyncio.TimeoutError:
+            outcome = 'timeout'
+            logger.error(f"Command {command} timed out after {spec.timeout} seconds")
+            await self.send_telegram_message(COMMAND_TIMEOUT_MESSAGE, reply_to_message_id=message_id, chat_id=chat_id)
+        except asyncio.CancelledError:
+            outcome = 'cancelled'
+            raise
         except Exception as e:
+            outcome = 'error'
             logger.error(f"Error processing command {command}: {e}")
+        finally:
+            metrics.observe('telegram_command_seconds', time.perf_counter() - started,
+                            'Command handling time until the reply is sent', command=spec.name if spec else 'unknown',
+                            outcome=outcome)
+    
+    async def command_start(self, ctx):
+        return START_TEMPLATE.format(
+            models=', '.join(self.models),
+            interval=self.check_interval,
+            monitoring='Aktif' if self.is_monitoring else 'Pasif'
+        )
+    
+    async def command_help(self, ctx):
+        return HELP_MESSAGE
+    
+    async def command_ping(self, ctx):
+        return PING_TEMPLATE.format(
+            time=datetime.now().strftime('%H:%M:%S'),
+            monitoring='Aktif' if self.is_monitoring else 'Pasif'
+        )
+    
+    async def command_durum(self, ctx):
+        parts = [STATUS_TEMPLATE.format(
+            monitoring='🟢 Aktif' if self.is_monitoring else '🔴 Pasif',
+            models=', '.join(self.models),
+            interval=self.check_interval,
+            vehicles=self.store.active_count(),
+            pending=self.notifier.pending_count(),
+            subscriptions=len(self.subscriptions),
+            subscription_chats=self.subscriptions.chat_count(),
+            **self.http_cache.stats
+        )]
+        if len(self.targets) == 1:
+            parts.append(f"🌐 <b>Tesla URL:</b> {self.targets[0].url}\n")
+            parts.append(f"🩺 <b>Kontrol Durumu:</b> {self.format_target_health(self.targets[0])}\n")
+        else:
+            parts.append(f"\n🌐 <b>Takip Edilen Envanterler ({len(self.targets)}):</b>\n")
+            for target in self.targets:
+                parts.append(
+                    f"• <b>{html.escape(target.name)}</b>: {', '.join(target.models)}, "
+                    f"{target.interval} sn, {self.store.active_count(target.name)} araç\n"
+                    f"   {self.format_target_health(target)}\n"
+                )
+            parts.append("\n")
+        parts.append(self.format_metrics_summary())
+        parts.append(f"🕐 <b>Son Güncelleme:</b> {datetime.now().strftime('%d.%m.%Y %H:%M:%S')}")
+        return ''.join(parts)
+    
+    async def command_modeller(self, ctx):
+        parts = ["🚗 <b>Takip Edilen Tesla Modelleri</b>\n\n"]
+        parts.extend(f"{i}. {model}\n" for i, model in enumerate(self.models, 1))
+        parts.append(f"\n📊 <b>Toplam:</b> {len(self.models)} model\n")
+        if len(self.targets) > 1:
+            parts.extend(f"🌐 <b>{html.escape(t.name)}:</b> {', '.join(t.models)}\n" for t in self.targets)
+        parts.append("\n💡 <b>Not:</b> Model listesini değiştirmek için bot ayarlarını güncelleyin.")
+        return ''.join(parts)
+    
+    async def command_durdur(self, ctx):
+        self.is_monitoring = False
+        for target in self.targets:
+            target.scheduler.wake()
+        logger.info("Monitoring stopped by user command")
+        return STOPPED_MESSAGE
+    
+    async def command_basla(self, ctx):
+        self.is_monitoring = True
+        # Check right away instead of finishing the current sleep
+        for target in self.targets:
+            target.scheduler.reset()
+            target.scheduler.wake()
+        logger.info("Monitoring started by user command")
+        return STARTED_TEMPLATE.format(interval=self.check_interval)
+    
+    async def command_son_degisiklikler(self, ctx, hours):
+        since = time.time() - hours * 3600
+        added = self.store.new_since(since)
+        removed = self.store.removed_since(since)
+        
+        parts = [f"🕑 <b>Son {hours} Saatteki Değişiklikler</b>\n\n", f"🆕 <b>Yeni:</b> {len(added)} araç\n"]
+        parts.extend(f"• {row['model']} - {html.escape(json.loads(row['attrs']).get('details', '')[:80])}\n" for row in added[:5])
+        parts.append(f"\n🗑️ <b>Kaldırılan:</b> {len(removed)} araç\n")
+        parts.extend(f"• {row['model']} - {html.escape(json.loads(row['attrs']).get('details', '')[:80])}\n" for row in removed[:5])
+        return ''.join(parts)
     
-    async def check_messages(self):
-        """Check for new messages and commands"""
+    async def command_fiyat_dususleri(self, ctx, hours):
+        drops = self.history.price_drops(time.time() - hours * 3600)
+        
+        parts = [f"💸 <b>Son {hours} Saatte Fiyatı Düşen Araçlar</b>\n\n"]
+        if not drops:
+            parts.append("Bu sürede fiyatı düşen araç yok.")
+        for drop in drops[:10]:
+            row = self.store.get_vehicle(drop.target, drop.vehicle_id)
+            parts.append(
+                f"• <b>{row['model'] if row else '?'}</b> {format_price(drop.old_price)} → "
+                f"<b>{format_price(drop.new_price)}</b> ({datetime.fromtimestamp(drop.at).strftime('%d.%m %H:%M')})\n"
+                f"   <code>{html.escape(drop.vehicle_id)}</code>\n"
+            )
+        if len(drops) > 10:
+            parts.append(f"\n... ve {len(drops) - 10} araç daha")
+        if drops:
+            parts.append("\n🔎 Ayrıntı için: <code>/arac VIN</code>")
+        return ''.join(parts)
+    
+    async def command_arac(self, ctx, vehicle_id):
+        targets = self.history.find(vehicle_id)
+        if not targets:
+            return f"❓ <b>{html.escape(vehicle_id)} için kayıt bulunamadı.</b>"
+        return ''.join(self.format_vehicle_history(target_name, vehicle_id) for target_name in targets)
+    
+    async def command_manuel_arama(self, ctx, force):
+        now = time.time()
+        stale, paused = [], []
+        for t in self.targets:
+            age = now - t.fetched_at
+            if t.scheduler.is_open or t.scheduler.is_backing_off:
+                # Leave Tesla alone until the scheduler's own backoff is over
+                paused.append(t)
+            elif age > self.snapshot_ttl or (force and age > MANUAL_REFRESH_MIN_AGE):
+                stale.append(t)
+        if stale:
+            await self.send_telegram_message(
+                MANUAL_SEARCH_STARTED_MESSAGE, reply_to_message_id=ctx.message_id, chat_id=ctx.chat_id
+            )
+        
+        # Fresh snapshots are answered as is; stale ones join or start a shared fetch
+        results = await asyncio.gather(*(self.fetch_inventory(t) for t in stale), return_exceptions=True)
+        failed = [(t, e) for t, e in zip(stale, results) if isinstance(e, Exception)]
+        for t, e in failed:
+            logger.error(f"[{t.name}] Manual search error: {e}")
+        vehicles = [vehicle for t in self.targets for vehicle in t.vehicles]
+        fetched = [t.fetched_at for t in self.targets if t.fetched_at]
+        
+        if failed and not vehicles:
+            return MANUAL_SEARCH_ERROR_TEMPLATE.format(url=failed[0][0].url)
+        if vehicles:
+            parts = [f"🎉 <b>Envanterde {len(vehicles)} araç bulundu!</b>\n\n"]
+            # İlk 5 aracı göster
+            parts.extend(f"🚗 <b>{vehicle.model}</b>\n📝 {html.escape(vehicle.details[:100])}...\n\n" for vehicle in vehicles[:5])
+            if len(vehicles) > 5:
+                parts.append(f"... ve {len(vehicles) - 5} araç daha\n\n")
+            parts.append(f"🔗 <a href='{self.targets[0].url}'>Tüm Envanteri Görüntüle</a>")
+        else:
+            parts = [
+                "😔 <b>Envanterde araç bulunamadı</b>\n\n",
+                "Takip edilen modellerde şu anda uygun araç yok.\n",
+                f"🚗 Aranan modeller: {', '.join(sorted({m for t in self.targets for m in t.models}))}\n\n",
+                f"🔗 <a href='{self.targets[0].url}'>Tesla Sitesini Kontrol Et</a>"
+            ]
+        
+        if fetched:
+            age = time.time() - min(fetched)
+            parts.append(f"\n\n🕒 <i>{format_age(age)} önceki sonuç.</i>")
+            if age > self.snapshot_ttl:
+                parts.append(" ⚠️ Site şu anda kontrol edilemedi.")
+            elif not force and not paused:
+                parts.append(" Güncellemek için <b>/manuel-arama yenile</b>")
+        if paused:
+            parts.append(MANUAL_SEARCH_PAUSED_MESSAGE)
+        return ''.join(parts)
+    
+    async def command_abone(self, ctx, text):
+        chat_id = ctx.chat_id or self.chat_id
+        if len(self.store.subscriptions(chat_id)) >= MAX_SUBSCRIPTIONS_PER_CHAT:
+            return (
+                f"⚠️ <b>En fazla {MAX_SUBSCRIPTIONS_PER_CHAT} abonelik eklenebilir.</b>\n\n"
+                "🗑️ <b>/abonelik-iptal</b> ile eskilerini silebilirsiniz."
+            )
         try:
-            updates = await self.bot.get_updates()
-            
-            for update in updates:
-                if update.message and update.message.text:
-                    text = update.message.text.strip()
-                    message_id = update.message.message_id
-                    
-                    # Process commands
-                    if text.startswith('/'):
-                        command = text.split()[0].lower()
-                        await self.process_command(command, message_id)
-                    
-                    # Clear processed updates
-                    await self.bot.get_updates(offset=update.update_id + 1)
-                    
-        except Exception as e:
-            logger.debug(f"Error checking messages: {e}")
+            models = list(dict.fromkeys(m for t in self.targets for m in t.models))
+            subscription = parse_subscription(chat_id, text, models)
+        except ValueError as e:
+            return (
+                f"❌ <b>Abonelik eklenemedi</b>\n\n{html.escape(str(e))}\n\n"
+                "📋 Kullanım için <b>/abone</b> yazın."
+            )
+        self.subscriptions.add(self.store.add_subscription(subscription))
+        logger.info(f"Chat {subscription.chat_id} subscribed: {subscription.describe()}")
+        return (
+            f"✅ <b>Abonelik #{subscription.id} eklendi</b>\n\n"
+            f"🔔 {html.escape(subscription.describe())}\n\n"
+            "📋 Aboneliklerinizi <b>/aboneliklerim</b> ile görebilirsiniz."
+        )
+    
+    async def command_aboneliklerim(self, ctx):
+        subscriptions = self.store.subscriptions(ctx.chat_id or self.chat_id)
+        if not subscriptions:
+            return "🔕 <b>Aboneliğiniz yok</b>\n\n🔔 Eklemek için <b>/abone</b> komutunu kullanın."
+        parts = [f"🔔 <b>Abonelikleriniz ({len(subscriptions)})</b>\n\n"]
+        parts.extend(f"#{subscription.id} - {html.escape(subscription.describe())}\n" for subscription in subscriptions)
+        parts.append("\n🗑️ Silmek için: <code>/abonelik-iptal numara</code> veya <code>/abonelik-iptal hepsi</code>")
+        return ''.join(parts)
+    
+    async def command_abonelik_iptal(self, ctx, subscription_id):
+        removed = self.store.remove_subscriptions(ctx.chat_id or self.chat_id, subscription_id)
+        if not removed:
+            return "❓ <b>Bu numarada bir aboneliğiniz yok.</b>\n\n📋 <b>/aboneliklerim</b> ile kontrol edebilirsiniz."
+        for removed_id in removed:
+            self.subscriptions.remove(removed_id)
+        return f"🗑️ <b>{len(removed)} abonelik silindi.</b>"
+    
+    def handle_update(self, update):
+        """Dispatch a command from an incoming update as its own task"""
+        if not (update.message and update.message.text):
+            return
+        
+        text = update.message.text.strip()
+        if not text.startswith('/'):
+            return
+        
+        parts = text.split()
+        # Commands in groups may be addressed as /command@BotName
+        command = parts[0].split('@')[0].lower()
+        if len(self._command_tasks) >= self.max_command_tasks:
+            metrics.inc('telegram_commands_dropped_total', 1, 'Commands ignored because too many were running')
+            logger.warning(f"Dropping {command} from chat {update.message.chat_id}: "
+                           f"{len(self._command_tasks)} commands still running")
+            return
+        task = asyncio.create_task(
+            self.process_command(command, update.message.message_id, parts[1:], update.message.chat_id)
+        )
+        self._command_tasks.add(task)
+        task.add_done_callback(self._command_tasks.discard)
+    
+    async def start_update_intake(self):
+        """Start receiving commands via webhook, falling back to long polling"""
+        if self.update_mode == 'webhook':
+            if not self.webhook_url:
+                logger.error("UPDATE_MODE=webhook but WEBHOOK_URL is not set, falling back to polling")
+            else:
+                try:
+                    await self.webhook.start(self.webhook_url)
+                    return None
+                except (OSError, TelegramError) as e:
+                    logger.error(f"Could not start webhook, falling back to polling: {e}")
+                    await self.webhook.stop()
+        
+        # A webhook left over from an earlier run blocks getUpdates
+        try:
+            await self.bot.delete_webhook()
+        except TelegramError as e:
+            logger.warning(f"Could not delete webhook: {e}")
+        return asyncio.create_task(self.poller.run())
     
     def format_vehicle_message(self, vehicle):
         """Format vehicle information for Telegram"""
         message = f"🚗 <b>Yeni Tesla Araç!</b>\n\n"
-        message += f"<b>Model:</b> {vehicle['model']}\n"
-        message += f"<b>Detaylar:</b> {vehicle['details']}\n\n"
-        message += f"<a href='{vehicle['url']}'>Envanteri Görüntüle</a>"
+        message += f"<b>Model:</b> {vehicle.model}\n"
+        message += f"<b>Detaylar:</b> {html.escape(vehicle.details)}\n\n"
+        message += f"<a href='{vehicle.url}'>Envanteri Görüntüle</a>"
         return message
     
-    async def check_inventory(self):
-        """Check for new vehicles in inventory"""
+    def format_vehicle_digest(self, vehicles, target=None):
+        """Format many new vehicles as as few Telegram messages as possible"""
+        if len(vehicles) == 1:
+            return [self.format_vehicle_message(vehicles[0])]
+        
+        header = f"🚗 <b>{len(vehicles)} Yeni Tesla Araç!</b>\n\n"
+        if target is not None and len(self.targets) > 1:
+            header = f"🚗 <b>{len(vehicles)} Yeni Tesla Araç!</b> ({html.escape(target.name)})\n\n"
+        entries = [
+            f"• <b>{vehicle.model}</b> - {html.escape(vehicle.details)}\n"
+            for vehicle in vehicles
+        ]
+        footer = f"\n<a href='{vehicles[0].url}'>Envanteri Görüntüle</a>"
+        return split_message(header, entries, footer)
+    
+    def notify_subscribers(self, vehicles, target=None, formatter=None, include_configured_chat=False):
+        """Queue a digest for every subscribed chat with the vehicles matching its filters
+
+        The configured chat is skipped unless include_configured_chat is set, since it is
+        normally told about all of these vehicles already.
+        """
+        formatter = formatter or (lambda chat_vehicles: self.format_vehicle_digest(chat_vehicles, target))
+        per_chat = self.subscriptions.fan_out(vehicles)
+        if not include_configured_chat:
+            per_chat.pop(str(self.chat_id), None)
+        if not per_chat:
+            return
+        
+        # Chats with the same matches share the formatted messages
+        digests = {}
+        texts_by_chat = {}
+        for chat_id, chat_vehicles in per_chat.items():
+            key = tuple(vehicle.id for vehicle in chat_vehicles)
+            if key not in digests:
+                digests[key] = formatter(chat_vehicles)
+            texts_by_chat[chat_id] = digests[key]
+        self.notifier.enqueue_many(texts_by_chat)
+        metrics.inc('subscriber_notifications_total', len(per_chat), 'Subscribed chats notified about new vehicles')
+        logger.info(f"[{target.name if target else '-'}] Notifying {len(per_chat)} subscribed chats")
+    
+    def on_diff(self, kind, handler):
+        """Call handler(items, target) whenever a scrape diff has `kind` events (see DIFF_EVENTS)"""
+        self.diff_handlers[kind].append(handler)
+    
+    def dispatch_diff(self, diff, target):
+        for kind in DIFF_EVENTS:
+            items = getattr(diff, kind)
+            if not items:
+                continue
+            for handler in self.diff_handlers[kind]:
+                try:
+                    handler(items, target)
+                except Exception as e:
+                    logger.error(f"[{target.name}] Error handling {kind} vehicles: {e}")
+    
+    def notify_chat(self, formatter):
+        """Diff handler queueing formatter(items, target) for the configured chat"""
+        def handler(items, target):
+            texts = formatter(items, target)
+            if texts:
+                self.notifier.enqueue(self.chat_id, texts)
+        return handler
+    
+    def notify_price_drops(self, drops, vehicles, target):
+        """Tell the configured chat and matching subscribers about vehicles that got cheaper"""
+        by_id = {vehicle.id: vehicle for vehicle in vehicles}
+        dropped = {drop.vehicle_id: drop for drop in drops}
+        
+        def formatter(chat_vehicles):
+            return self.format_price_drops([(dropped[v.id], v) for v in chat_vehicles], target)
+        
+        dropped_vehicles = [by_id[drop.vehicle_id] for drop in drops]
+        self.notifier.enqueue(self.chat_id, formatter(dropped_vehicles))
+        self.notify_subscribers(dropped_vehicles, target, formatter)
+    
+    def _digest_header(self, title, target):
+        header = title
+        if target is not None and len(self.targets) > 1:
+            header += f" ({html.escape(target.name)})"
+        return header + "\n\n"
+    
+    def format_returned_vehicles(self, vehicles, target=None):
+        """Vehicles that were removed earlier and are listed again"""
+        header = self._digest_header(f"🔁 <b>{len(vehicles)} Araç Tekrar Listede</b>", target)
+        entries = [
+            f"• <b>{vehicle.model}</b> - {html.escape(vehicle.details)}\n"
+            for vehicle in vehicles
+        ]
+        footer = f"\n<a href='{vehicles[0].url}'>Envanteri Görüntüle</a>"
+        return split_message(header, entries, footer)
+    
+    def format_removed_vehicles(self, vehicle_ids, target):
+        """Vehicles that left the inventory (sold or unlisted), described from the store"""
+        header = self._digest_header(f"🚫 <b>{len(vehicle_ids)} Araç Envanterden Kalktı</b>", target)
+        entries = []
+        for vehicle_id in vehicle_ids:
+            row = self.store.get_vehicle(target.name, vehicle_id)
+            attrs = json.loads(row['attrs']) if row else {}
+            price = f" - {format_price(attrs['price'])}" if attrs.get('price') else ''
+            entries.append(
+                f"• <b>{row['model'] if row else 'Araç'}</b> {html.escape(attrs.get('trim') or '')}{price}\n"
+                f"   <code>{html.escape(vehicle_id)}</code>\n"
+            )
+        return split_message(header, entries)
+    
+    def format_vehicle_changes(self, changes, target=None):
+        """Listed vehicles whose model, trim, price, color or location changed
+
+        Price decreases are left to the price drop alerts; changes to other fields
+        (description text, links) are not worth a message.
+        """
+        entries = []
+        for change in changes:
+            vehicle = change.vehicle
+            parts = []
+            for name, label in CHANGE_LABELS.items():
+                if name not in change.previous:
+                    continue
+                old, new = change.previous[name], getattr(vehicle, name)
+                if name == 'price':
+                    if old and new and new < old:
+                        continue
+                    old, new = (format_price(value) if value else '-' for value in (old, new))
+                parts.append(f"{label}: {html.escape(str(old or '-'))} → <b>{html.escape(str(new or '-'))}</b>")
+            if parts:
+                entries.append(
+                    f"• <b>{vehicle.model}</b> {html.escape(vehicle.trim or '')}\n"
+                    f"   {', '.join(parts)}\n"
+                    f"   <code>{html.escape(vehicle.id)}</code>\n"
+                )
+        if not entries:
+            return []
+        header = self._digest_header(f"✏️ <b>{len(entries)} Araçta Değişiklik</b>", target)
+        return split_message(header, entries)
+    
+    def format_vehicle_history(self, target_name, vehicle_id):
+        """Listing time and price changes of one vehicle for /arac"""
+        history = self.history.vehicle_history(target_name, vehicle_id)
+        row = self.store.get_vehicle(target_name, vehicle_id)
+        attrs = json.loads(row['attrs']) if row else {}
+        
+        # Time spent listed, and when the current listing started
+        listed_seconds = 0
+        listed_since = None
+        for at, _, status in history:
+            if status == PriceHistory.LISTED and listed_since is None:
+                listed_since = at
+            elif status == PriceHistory.REMOVED and listed_since is not None:
+                listed_seconds += at - listed_since
+                listed_since = None
+        if listed_since is not None:
+            listed_seconds += time.time() - listed_since
+        
+        message = f"🚗 <b>{row['model'] if row else 'Araç'}</b> <code>{html.escape(vehicle_id)}</code>\n"
+        if len(self.targets) > 1:
+            message += f"🌐 {html.escape(target_name)}\n"
+        if attrs.get('details'):
+            message += f"📝 {html.escape(attrs['details'])}\n"
+        if listed_since is not None:
+            message += f"🟢 <b>Listede</b> ({datetime.fromtimestamp(listed_since).strftime('%d.%m.%Y %H:%M')} tarihinden beri)\n"
+        else:
+            message += "🔴 <b>Listeden kaldırıldı</b>\n"
+        message += f"⏳ <b>Toplam listede kalma:</b> {listed_seconds / 86400:.1f} gün\n"
+        
+        changes = []
+        previous = None
+        for at, price, status in history:
+            if price > 0 and price != previous:
+                changes.append((at, price))
+                previous = price
+        if changes:
+            message += "\n<b>💰 Fiyat geçmişi:</b>\n"
+            for at, price in changes[-8:]:
+                message += f"• {datetime.fromtimestamp(at).strftime('%d.%m.%Y')} - {format_price(price)}\n"
+        return message + "\n"
+    
+    def format_price_drops(self, drops, target=None):
+        """Format (PriceDrop, VehicleRecord) pairs as few messages as possible"""
+        header = f"💸 <b>Fiyatı Düşen {len(drops)} Araç</b>"
+        if target is not None and len(self.targets) > 1:
+            header += f" ({html.escape(target.name)})"
+        header += "\n\n"
+        entries = [
+            f"• <b>{vehicle.model}</b> {html.escape(vehicle.trim or '')} - "
+            f"{format_price(drop.old_price)} → <b>{format_price(drop.new_price)}</b> "
+            f"(-%{(drop.old_price - drop.new_price) * 100 / drop.old_price:.1f})\n"
+            f"   <code>{html.escape(drop.vehicle_id)}</code>\n"
+            for drop, vehicle in drops
+        ]
+        footer = f"\n<a href='{drops[0][1].url}'>Envanteri Görüntüle</a>"
+        return split_message(header, entries, footer)
+    
+    async def check_inventory(self, target=None, now=None):
+        """Check for new vehicles in inventory
+
+        `now` stamps the store and history (a replay passes the recorded fetch time).
+        """
         if not self.is_monitoring:
             logger.info("Monitoring is disabled, skipping inventory check")
             return
+        
+        if target is None:
+            await asyncio.gather(*(self.check_inventory(t, now) for t in self.targets))
+            return
             
-        logger.info("Checking Tesla inventory...")
+        logger.info(f"[{target.name}] Checking Tesla inventory...")
         
+        started = time.perf_counter()
         try:
-            vehicles = self.get_tesla_inventory()
-            current_vehicle_ids = {v['id'] for v in vehicles}
+            try:
+                vehicles, _ = await self.fetch_inventory(target)
+            except (FetchError, ParseTimeout) as e:
+                # Already recorded on the scheduler when the fetch finished
+                logger.error(f"[{target.name}] Error fetching Tesla inventory: {e}")
+                return
             
-            # Find new vehicles
-            new_vehicle_ids = current_vehicle_ids - self.last_vehicles
+            # Also true when a manual search fetched the changed page since the last check
+            changed, target.pending_diff = target.pending_diff, False
+            if not changed:
+                # Nothing to diff: same page or same records as last time
+                self.store.mark_unchanged(target.name, now)
+                target.scheduler.record_success(changed=False)
+                logger.info(f"[{target.name}] No new vehicles found")
+                return
             
-            if new_vehicle_ids:
-                logger.info(f"Found {len(new_vehicle_ids)} new vehicles!")
-                
-                # Send notification for each new vehicle
-                for vehicle in vehicles:
-                    if vehicle['id'] in new_vehicle_ids:
-                        message = self.format_vehicle_message(vehicle)
-                        await self.send_telegram_message(message)
-                        await asyncio.sleep(1)  # Avoid rate limiting
-                
-                # Update last known inventory
-                self.last_vehicles = current_vehicle_ids
-                self.save_last_inventory()
+            if not vehicles:
+                # An empty result is far more often a blocked or broken page than an empty inventory
+                logger.info(f"[{target.name}] No vehicles returned, keeping the stored inventory as is")
+                target.scheduler.record_success(changed=False)
+                return
+            
+            baseline_key = f'needs_baseline:{target.name}'
+            if self.store.get_meta(baseline_key) == '1':
+                # One-time migration from the legacy cache: record what is listed now without notifying
+                self.store.apply_scrape(target.name, vehicles, now)
+                self.history.record_scrape(target.name, vehicles, now)
+                self.store.set_meta(baseline_key, '0')
+                logger.info(f"[{target.name}] Migrated inventory cache, recorded {len(vehicles)} vehicles without notifying")
+                target.scheduler.record_success(changed=False)
+                return
+            
+            diff_started = time.perf_counter()
+            diff = self.store.apply_scrape(target.name, vehicles, now)
+            metrics.observe('tesla_diff_seconds', time.perf_counter() - diff_started,
+                            'Time to diff a scrape against the store', target=target.name)
+            for kind in DIFF_EVENTS:
+                metrics.inc('tesla_diff_vehicles_total', len(getattr(diff, kind)),
+                            'Vehicles added, returned, removed or changed between checks', target=target.name, kind=kind)
+                metrics.set('tesla_diff_last_size', len(getattr(diff, kind)),
+                            'Vehicles in the last scrape diff', target=target.name, kind=kind)
+            target.scheduler.record_success(changed=any(getattr(diff, kind) for kind in DIFF_EVENTS))
+            drops = self.history.record_scrape(target.name, vehicles, now)
+            if drops:
+                logger.info(f"[{target.name}] Price dropped for {len(drops)} vehicles")
+                self.notify_price_drops(drops, vehicles, target)
+            if diff.returned or diff.removed or diff.changed:
+                logger.info(f"[{target.name}] {len(diff.returned)} vehicles came back, {len(diff.removed)} vehicles removed, "
+                            f"{len(diff.changed)} vehicles changed")
+            
+            if diff.added:
+                logger.info(f"[{target.name}] Found {len(diff.added)} new vehicles!")
             else:
-                logger.info("No new vehicles found")
+                logger.info(f"[{target.name}] No new vehicles found")
+            
+            # Queue notifications; the notifier delivers them in the background
+            self.dispatch_diff(diff, target)
                 
         except Exception as e:
-            logger.error(f"Error checking inventory: {e}")
+            logger.error(f"[{target.name}] Error checking inventory: {e}")
+            target.scheduler.record_failure(e)
+            # Don't let the cache hide this page's changes on the next check
+            self.http_cache.entries.pop(target.name, None)
+        finally:
+            metrics.observe('tesla_check_seconds', time.perf_counter() - started,
+                            'Whole inventory check: fetch, extract, diff and queueing', target=target.name)
+    
+    async def monitor_target(self, target):
+        """Check one target forever, letting its scheduler pick the delay between checks"""
+        scheduler = target.scheduler
+        while True:
+            if not self.is_monitoring:
+                # Paused by /durdur; /basla wakes us up
+                await scheduler.sleep()
+                continue
+            
+            try:
+                await self.check_inventory(target)
+            except Exception as e:
+                logger.error(f"[{target.name}] Unexpected error in monitor loop: {e}")
+                scheduler.record_failure(e)
+            
+            delay = scheduler.next_delay()
+            logger.info(f"[{target.name}] Waiting {delay:.0f} seconds until next check...")
+            await scheduler.sleep(delay)
+    
+    def format_target_health(self, target):
+        """One-line scheduler state for /durum"""
+        scheduler = target.scheduler
+        if scheduler.is_open:
+            until = datetime.fromtimestamp(scheduler.open_until).strftime('%H:%M')
+            return f"🔴 {scheduler.failures} hata sonrası duraklatıldı ({until} saatine kadar)"
+        if scheduler.failures:
+            return f"🟠 {scheduler.failures} ardışık hata, yavaşlatıldı"
+        return f"🟢 Normal, aralık {scheduler.interval} sn"
+    
+    def format_metrics_summary(self):
+        """Compact timing block for /durum: average (last) per stage"""
+        def timing(name, **labels):
+            count, avg, last = metrics.summary(name, **labels)
+            if not count:
+                return '-'
+            return f"{avg * 1000:.0f} ms ({last * 1000:.0f})"
+        
+        candidates = metrics.value('tesla_extract_candidates_total')
+        kept = metrics.value('tesla_extract_vehicles_total')
+        fetch_errors = metrics.summary('tesla_fetch_seconds')[0] - sum(
+            metrics.summary('tesla_fetch_seconds', status=status)[0] for status in (200, 304)
+        )
+        _, lag_avg, lag_last = metrics.summary('event_loop_lag_seconds')
+        
+        message = "\n⏱️ <b>Süreler</b> (ortalama, son):\n"
+        message += f"• İndirme: {timing('tesla_fetch_seconds', status=200)}, {fetch_errors} hata\n"
+        message += f"• Ayrıştırma: {timing('tesla_extract_seconds')}, {kept}/{candidates} araç tutuldu\n"
+        message += f"• Fark: {timing('tesla_diff_seconds')}, toplam kontrol {timing('tesla_check_seconds')}\n"
+        message += f"• Telegram gönderim: {timing('telegram_send_seconds', outcome='ok')}\n"
+        message += f"• Komut yanıtı: {timing('telegram_command_seconds', outcome='ok')}\n"
+        message += f"• Döngü gecikmesi: {lag_avg * 1000:.1f} ms ({(lag_last or 0) * 1000:.1f})\n"
+        message += f"• Bellek: {process_rss_bytes() / (1024 * 1024):.1f} MB"
+        workers_rss = self.parse_pool.worker_rss_bytes()
+        if workers_rss:
+            message += f" (+{workers_rss / (1024 * 1024):.1f} MB ayrıştırma işlemleri)"
+        message += "\n\n"
+        return message
     
     async def run(self):
         """Main bot loop"""
@@ -378,7 +3223,10 @@ class TeslaInventoryBot:
         startup_message = "🤖 <b>Tesla Envanter Bot başlatıldı!</b>\n\n"
         startup_message += f"📊 <b>Takip edilen modeller:</b> {', '.join(self.models)}\n"
         startup_message += f"⏰ <b>Kontrol aralığı:</b> {self.check_interval} saniye\n"
-        startup_message += f"🔄 <b>Otomatik takip:</b> {'Aktif' if self.is_monitoring else 'Pasif'}\n\n"
+        startup_message += f"🔄 <b>Otomatik takip:</b> {'Aktif' if self.is_monitoring else 'Pasif'}\n"
+        if len(self.targets) > 1:
+            startup_message += f"🌐 <b>Takip edilen envanterler:</b> {', '.join(t.name for t in self.targets)}\n"
+        startup_message += "\n"
         startup_message += "<b>📋 Kullanılabilir Komutlar:</b>\n"
         startup_message += "/help - Yardım menüsü\n"
         startup_message += "/ping - Bot durumu\n"
@@ -388,42 +3236,38 @@ class TeslaInventoryBot:
         
         await self.send_telegram_message(startup_message)
         
-        # Main loop
-        last_message_check = 0
-        message_check_interval = 5  # Check for messages every 5 seconds
+        notifier_task = asyncio.create_task(self.notifier.run())
+        lag_task = asyncio.create_task(watch_event_loop_lag())
+        if self.metrics_server:
+            try:
+                await self.metrics_server.start()
+            except OSError as e:
+                logger.error(f"Could not start metrics endpoint: {e}")
+                self.metrics_server = None
+        
+        poller_task = await self.start_update_intake()
         
+        # Main loop: every target is checked concurrently over the shared connection pool
+        monitor_tasks = [asyncio.create_task(self.monitor_target(target)) for target in self.targets]
         try:
-            while True:
-                try:
-                    current_time = time.time()
-                    
-                    # Check for messages periodically
-                    if current_time - last_message_check > message_check_interval:
-                        await self.check_messages()
-                        last_message_check = current_time
-                    
-                    # Check inventory
-                    await self.check_inventory()
-                    logger.info(f"Waiting {self.check_interval} seconds until next check...")
-                    
-                    # Sleep in smaller chunks to allow message checking
-                    sleep_time = 0
-                    while sleep_time < self.check_interval:
-                        await asyncio.sleep(min(5, self.check_interval - sleep_time))
-                        sleep_time += 5
-                        
-                        # Check messages during sleep
-                        if sleep_time % message_check_interval == 0:
-                            await self.check_messages()
-                    
-                except KeyboardInterrupt:
-                    logger.info("Bot stopped by user")
-                    break
-                except Exception as e:
-                    logger.error(f"Unexpected error in main loop: {e}")
-                    await asyncio.sleep(60)  # Wait 1 minute before retrying
+            await asyncio.gather(*monitor_tasks)
+        except KeyboardInterrupt:
+            logger.info("Bot stopped by user")
         except Exception as e:
             logger.error(f"Fatal error: {e}")
+        finally:
+            for task in monitor_tasks + list(self._command_tasks):
+                task.cancel()
+            if poller_task:
+                poller_task.cancel()
+            await self.webhook.stop()
+            if self.metrics_server:
+                await self.metrics_server.stop()
+            lag_task.cancel()
+            notifier_task.cancel()
+            await self.fetcher.close()
+            self.parse_pool.close()
+            self.store.close()
 
 if __name__ == "__main__":
     bot = TeslaInventoryBot()
@@ -50,7 +50,7 @@ mkdir -p "$DATA_DIR"
 
 # Python dependencies kontrol et
 echo "📦 Python dependencies kontrol ediliyor..."
-python3 -c "import requests, bs4, telegram, asyncio" 2>/dev/null
+python3 -c "import aiohttp, bs4, telegram, asyncio" 2>/dev/null
 if [ $? -eq 0 ]; then
     echo "✅ Tüm dependencies mevcut"
 else